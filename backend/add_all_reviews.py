@@ -2,11 +2,9 @@
 Add all 52 real Checkatrade reviews to the database with proper geocoding
 """
 import asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
 from dotenv import load_dotenv
 from pathlib import Path
-import uuid
+from database import Database
 
 # London postcode to coordinates mapping (approximate centers)
 POSTCODE_COORDS = {
@@ -46,9 +44,8 @@ async def add_all_reviews():
     ROOT_DIR = Path('/app/backend')
     load_dotenv(ROOT_DIR / '.env')
     
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[os.environ['DB_NAME']]
+    database = Database()
+    database.connect()
     
     reviews_data = [
         (10, "Weeding and garden clearance", "Tidied shrubs and cleared weeds. Left garden looking much better and easier to maintain. Good communicators and quick to respond. Happy to recommend.", "SW19"),
@@ -105,10 +102,6 @@ async def add_all_reviews():
         (10, "Garden Cleanup", "They completely transformed my overgrown garden. They came on time and did a great job. Will be using them again for sure!", "SW19"),
     ]
     
-    # Clear existing reviews
-    delete_result = await db.reviews.delete_many({})
-    print(f"Deleted {delete_result.deleted_count} existing reviews")
-    
     # Add all reviews with coordinate offsets for duplicate postcodes
     mongo_reviews = []
     postcode_counts = {}  # Track how many times we've used each postcode
@@ -135,7 +128,6 @@ async def add_all_reviews():
         lng = base_lng + lng_offset
         
         review_doc = {
-            'id': str(uuid.uuid4()),
             'name': 'Verified Customer',
             'rating': rating,
             'date': 'Recent',
@@ -151,10 +143,11 @@ async def add_all_reviews():
         
         mongo_reviews.append(review_doc)
     
-    # Insert all reviews
-    if mongo_reviews:
-        result = await db.reviews.insert_many(mongo_reviews)
-        print(f"✅ Inserted {len(result.inserted_ids)} real Checkatrade reviews")
+    # Apply only what changed since the last import; running API workers
+    # drop their cached reviews on their next version check
+    report = await database.ingest_reviews(mongo_reviews, source="checkatrade")
+    print(f"✅ Ingested real Checkatrade reviews: {report['inserted']} new, {report['updated']} updated, "
+          f"{report['deleted']} removed, {report['unchanged']} unchanged, {report['errors']} errors")
     
     # Print summary
     print(f"\n📊 Review Import Summary:")
@@ -163,7 +156,7 @@ async def add_all_reviews():
     print(f"Average rating: {avg_rating:.2f}/10 ({avg_rating/2:.2f}/5)")
     print(f"\nUnique postcodes: {len(set(r['postcode'] for r in mongo_reviews))}")
     
-    client.close()
+    await database.close()
 
 if __name__ == "__main__":
     asyncio.run(add_all_reviews())
@@ -0,0 +1,116 @@
+"""
+Benchmark list endpoint serialization: FastAPI's response_model path versus
+fast_json.ListSerializer, and check that both produce identical bytes.
+
+Usage: python benchmark_serialization.py [count] [repeat]
+"""
+import asyncio
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from fast_json import ListSerializer
+from models import Contact, QuoteRequest, Review
+
+POSTCODES = ['SW11', 'SW12', 'SW16', 'SW17', 'SW18', 'SW19', 'SE5', None]
+TEXT = "Great communication from start to finish – the team arrived on time and left the garden spotless. "
+
+def make_reviews(count: int, seed: int = 1) -> List[dict]:
+    rng = random.Random(seed)
+    docs = []
+    for i in range(count):
+        postcode = rng.choice(POSTCODES)
+        docs.append({
+            '_id': ObjectId(),
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'name': 'Verified Customer',
+            'rating': rng.choice([10, 9, 8, 9.67, 7.5]),
+            'date': f"{rng.randint(1, 28)} days ago",
+            'text': TEXT * rng.randint(1, 4),
+            'service': rng.choice(['Garden Clearance', 'Hedge Trimming', 'Turfing', 'Ivy Removal']),
+            'postcode': postcode,
+            'lat': 51.4 + rng.random() / 10 if postcode else None,
+            'lng': -0.2 + rng.random() / 10 if postcode else None,
+            'images': [f"https://storage.googleapis.com/media/{i}-{n}.jpeg" for n in range(rng.randint(0, 3))],
+            'approved': True,
+            # Seeded reviews store ISO strings, API-created ones BSON dates
+            'created_at': '2024-01-01T00:00:00' if i % 3 else datetime(2025, 1, 1) + timedelta(minutes=i, milliseconds=i),
+        })
+    return docs
+
+def make_edge_cases() -> List[dict]:
+    """Documents the fast path must hand to full validation"""
+    base = make_reviews(3, seed=2)
+    base[0]['created_at'] = '2024-01-01T00:00:00.000Z'
+    base[1]['created_at'] = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    base[2]['rating'] = '9'
+    return base
+
+def make_quotes(count: int) -> List[dict]:
+    return [{
+        '_id': ObjectId(),
+        'id': str(uuid.uuid4()),
+        'name': f'Customer {i} – Zoë',
+        'email': f'customer{i}@Example.COM',
+        'phone': '07700 900123',
+        'service': 'Garden Clearance',
+        'message': 'Line one\nLine two\t"quoted" \x01 ✓',
+        'status': 'pending',
+        'created_at': datetime(2025, 1, 1) + timedelta(seconds=i),
+    } for i in range(count)]
+
+async def render_response_model(model, docs) -> bytes:
+    """What FastAPI does today for response_model=List[model]"""
+    field = create_response_field(name=f"Response_{model.__name__}", type_=List[model])
+    content = await serialize_response(field=field, response_content=docs, is_coroutine=True)
+    return JSONResponse(content).body
+
+def project(serializer: ListSerializer, docs: List[dict]) -> List[dict]:
+    """What the model projection in database.py leaves of each document"""
+    fields = [name for name, _, _ in serializer.fields]
+    return [{name: doc[name] for name in fields if name in doc} for doc in docs]
+
+def timed(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    loop = asyncio.new_event_loop()
+
+    # Identical output, including the fallback path
+    for model, docs in ((Review, make_reviews(count)), (Review, make_edge_cases()),
+                        (QuoteRequest, make_quotes(50)), (Contact, [])):
+        serializer = ListSerializer(model)
+        expected = loop.run_until_complete(render_response_model(model, docs))
+        actual = serializer.render(project(serializer, docs))
+        status = 'identical' if actual == expected else 'MISMATCH'
+        print(f"{model.__name__:<13} {len(docs):>5} docs: {status} ({serializer.stats})")
+        if actual != expected:
+            sys.exit(1)
+
+    docs = make_reviews(count)
+    serializer = ListSerializer(Review)
+    projected = project(serializer, docs)
+    before = timed(lambda: loop.run_until_complete(render_response_model(Review, docs)), repeat)
+    after = timed(lambda: serializer.render(projected), repeat)
+    size = len(serializer.render(projected))
+    print(f"\n{count} reviews, {size} bytes, best of {repeat}:")
+    print(f"  response_model + JSONResponse: {before * 1000:8.2f} ms")
+    print(f"  fast_json.ListSerializer:      {after * 1000:8.2f} ms  ({before / after:.1f}x faster)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Build the image metadata index (dimensions, orientation, dominant colour,
+blurhash, LQIP) for gallery and review photos.
+
+Runs incrementally: Drive photos whose id and size are unchanged and review
+objects already in the index are skipped without a download, and images whose
+downloaded bytes hash to a known content hash reuse the stored metadata
+instead of being decoded again. Decoding runs in a process pool.
+
+Usage: python build_image_metadata.py [--force] [--gallery-only]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from gallery import GALLERY_DATA_PATH, is_image_photo
+from image_keys import canonical_image_key
+from image_metadata import IMAGE_METADATA_PATH, analyze_image
+from image_transform import HEIF_SUPPORTED, is_heif
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def load_index(path: str) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get('images', {})
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        logger.warning(f"Ignoring unreadable metadata index {path}: {e}")
+        return {}
+
+def write_index(path: str, images: Dict[str, Dict[str, Any]]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'generated_at': datetime.utcnow().isoformat(), 'images': images}, f, indent=2)
+    os.replace(tmp_path, path)
+
+def gallery_sources(path: str) -> List[Dict[str, Any]]:
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        logger.warning(f"No gallery dataset at {path}")
+        return []
+    sources = []
+    for album in data.values():
+        for photo in album.get('photos', []):
+            url = photo.get('url')
+            # Videos share the dataset but have no pixels for us to read
+            if not url or not is_image_photo(photo):
+                continue
+            sources.append({
+                'key': canonical_image_key(url),
+                'url': url,
+                'source': 'gallery',
+                'drive_id': photo.get('drive_id'),
+                'drive_size': photo.get('size'),
+            })
+    return sources
+
+async def review_sources() -> List[Dict[str, Any]]:
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        db = client[os.environ['DB_NAME']]
+        urls = await db.reviews.distinct('images', {'approved': True})
+    finally:
+        client.close()
+    return [{'key': canonical_image_key(url), 'url': url, 'source': 'review'} for url in urls if url]
+
+def is_unchanged(source: Dict[str, Any], entry: Optional[Dict[str, Any]]) -> bool:
+    """Whether the stored entry can be trusted without downloading the image again"""
+    if entry is None or 'width' not in entry:
+        return False
+    if source['source'] == 'gallery':
+        return entry.get('drive_id') == source['drive_id'] and entry.get('drive_size') == source['drive_size']
+    # Review objects are keyed by their GCS path, which changes whenever the photo does
+    return True
+
+class MetadataBuilder:
+    def __init__(self, existing: Dict[str, Dict[str, Any]], executor: ProcessPoolExecutor):
+        self.existing = existing
+        self.executor = executor
+        self.concurrency = int(os.environ.get('IMAGE_METADATA_CONCURRENCY', 8))
+        self.by_hash = {entry['content_hash']: entry for entry in existing.values() if entry.get('content_hash')}
+        self.images: Dict[str, Dict[str, Any]] = {}
+        self.counts = {'unchanged': 0, 'reused': 0, 'analyzed': 0, 'failed': 0}
+
+    async def _process(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, source: Dict[str, Any]):
+        key = source['key']
+        entry = self.existing.get(key)
+        if is_unchanged(source, entry):
+            self.images[key] = {**entry, 'url': source['url']}
+            self.counts['unchanged'] += 1
+            return
+
+        async with semaphore:
+            try:
+                response = await client.get(source['url'])
+                response.raise_for_status()
+                content = response.content
+                content_hash = hashlib.sha256(content).hexdigest()
+
+                known = self.by_hash.get(content_hash)
+                if known is not None:
+                    metadata = {field: value for field, value in known.items()
+                                if field not in ('url', 'source', 'drive_id', 'drive_size')}
+                    self.counts['reused'] += 1
+                else:
+                    if is_heif(source['url'], response.headers.get('content-type')) and not HEIF_SUPPORTED:
+                        raise Exception("HEIC image but pillow-heif is not installed")
+                    loop = asyncio.get_running_loop()
+                    metadata = await loop.run_in_executor(self.executor, analyze_image, content)
+                    metadata['content_hash'] = content_hash
+                    self.by_hash[content_hash] = metadata
+                    self.counts['analyzed'] += 1
+            except Exception as e:
+                self.counts['failed'] += 1
+                logger.warning(f"Failed to index {source['url']}: {e}")
+                # Keep whatever we had rather than dropping the image from the index
+                if entry is not None:
+                    self.images[key] = entry
+                return
+
+        self.images[key] = {
+            **metadata,
+            'url': source['url'],
+            'source': source['source'],
+            **({'drive_id': source['drive_id'], 'drive_size': source['drive_size']}
+               if source['source'] == 'gallery' else {}),
+        }
+
+    async def run(self, sources: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        timeout = httpx.Timeout(30.0, connect=10.0)
+        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+            await asyncio.gather(*(self._process(client, semaphore, source) for source in sources))
+        return self.images
+
+async def build_image_metadata(force: bool = False, gallery_only: bool = False):
+    ROOT_DIR = Path(__file__).parent
+    load_dotenv(ROOT_DIR / '.env')
+
+    existing = {} if force else load_index(IMAGE_METADATA_PATH)
+    sources = gallery_sources(GALLERY_DATA_PATH)
+    if not gallery_only:
+        sources.extend(await review_sources())
+    # Several URLs can point at the same object
+    sources = list({source['key']: source for source in sources}.values())
+    logger.info(f"Indexing {len(sources)} images ({len(existing)} already in the index)")
+
+    workers = int(os.environ.get('IMAGE_METADATA_WORKERS', 0)) or None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        builder = MetadataBuilder(existing, executor)
+        images = await builder.run(sources)
+
+    write_index(IMAGE_METADATA_PATH, images)
+    logger.info(f"Wrote metadata for {len(images)} images to {IMAGE_METADATA_PATH}: {builder.counts}")
+    return builder.counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the gallery and review image metadata index")
+    parser.add_argument('--force', action='store_true', help="ignore the existing index and analyze everything")
+    parser.add_argument('--gallery-only', action='store_true', help="skip review images (no MongoDB needed)")
+    args = parser.parse_args()
+    asyncio.run(build_image_metadata(force=args.force, gallery_only=args.gallery_only))
@@ -1,34 +1,177 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import List, Dict, Any, Optional
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, DeleteMany, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from typing import List, Dict, Any, Optional, Tuple
 import os
 from models import Service, Review, QuoteRequest, Contact, GalleryImage
+from mongo import create_client
+from query_cache import QueryCache, VERSIONS_COLLECTION, bump_collection_version
+from seed_data import SEED_GALLERY, SEED_SERVICES
+from storage import CREATED_AT_TYPES, PROJECTIONS, Storage, created_at_type, decode_page_cursor, encode_page_cursor
+from review_map import BACKFILL_FILTER, BACKFILL_UPDATE, MARKER_PROJECTION, POINT_PROJECTION, bbox_filter, marker, near_filter, with_location
+from review_ingest import INGEST_BATCH_SIZE, INGEST_PROJECTION, ingest_scope, plan_ingest
+from review_search import SEARCH_PROJECTION
 import logging
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-class Database:
+# Indexes each collection should have: (keys, options). The created_at sorts
+# carry id as a tie-breaker so listings walk the index instead of sorting in memory.
+INDEXES = {
+    "services": [
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+    ],
+    "reviews": [
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        ([("approved", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], {"name": "approved_created_at"}),
+        ([("location", GEOSPHERE)], {"name": "location_2dsphere"}),
+    ],
+    "quote_requests": [
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        ([("created_at", DESCENDING), ("id", DESCENDING)], {"name": "created_at"}),
+        ([("status", ASCENDING), ("created_at", DESCENDING)], {"name": "status_created_at"}),
+    ],
+    "contacts": [
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        ([("created_at", DESCENDING), ("id", DESCENDING)], {"name": "created_at"}),
+        ([("status", ASCENDING), ("created_at", DESCENDING)], {"name": "status_created_at"}),
+    ],
+    "gallery": [
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        ([("created_at", DESCENDING), ("id", DESCENDING)], {"name": "created_at"}),
+    ],
+}
+
+# Listings are ordered newest first with id as the tie-breaker, matching INDEXES
+LIST_SORT = [("created_at", DESCENDING), ("id", DESCENDING)]
+
+def keyset_filter(created_at: Any, last_id: str) -> Dict[str, Any]:
+    """Documents that come after (created_at, last_id) in LIST_SORT order"""
+    kind = created_at_type(created_at)
+    clauses = [{"created_at": created_at, "id": {"$lt": last_id}}]
+    if kind != "null":
+        clauses.append({"created_at": {"$lt": created_at}})
+    # Range operators only match within one type, so values of lower-sorting types
+    # (including a missing created_at) need their own clause
+    position = CREATED_AT_TYPES.index(kind)
+    if position > 0:
+        clauses.append({"$nor": [{"created_at": {"$type": t}} for t in CREATED_AT_TYPES[position:]]})
+    return {"$or": clauses}
+
+# Collections served through the read-through cache
+CACHED_COLLECTIONS = ("services", "reviews")
+
+class Database(Storage):
+    """MongoDB storage through the app's shared Motor client"""
     def __init__(self):
-        mongo_url = os.environ['MONGO_URL']
-        self.client = AsyncIOMotorClient(mongo_url)
+        # Set by connect() during app startup
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.db = None
+        self.cache = QueryCache()
+        self.cache.use_version_source(self._read_cache_versions)
+    
+    def connect(self, client: Optional[AsyncIOMotorClient] = None):
+        """Attach to MongoDB, creating the shared client unless one is passed in"""
+        self.client = client or create_client()
         self.db = self.client[os.environ['DB_NAME']]
         
     async def close(self):
-        self.client.close()
+        await self.cache.stop()
+        if self.client is not None:
+            self.client.close()
+    
+    def start_cache_invalidation(self):
+        """Start the change stream listener when QUERY_CACHE_INVALIDATION=change_stream"""
+        self.cache.watch(self.db, CACHED_COLLECTIONS)
+    
+    async def _read_cache_versions(self) -> Dict[str, int]:
+        docs = await self.db[VERSIONS_COLLECTION].find({"_id": {"$in": list(CACHED_COLLECTIONS)}}).to_list(None)
+        versions = {name: 0 for name in CACHED_COLLECTIONS}
+        versions.update({doc["_id"]: doc.get("version", 0) for doc in docs})
+        return versions
+    
+    async def _collection_changed(self, collection_name: str):
+        """Drop cached reads for a collection here and, via its version, in other workers"""
+        self.cache.invalidate(collection_name)
+        if self.cache.invalidation == "version":
+            try:
+                await bump_collection_version(self.db, collection_name)
+            except Exception as e:
+                logger.error(f"Error bumping cache version for {collection_name}: {e}")
+    
+    async def ensure_indexes(self) -> Dict[str, List[str]]:
+        """Create any missing indexes from INDEXES. Safe to run on every startup."""
+        report = {"created": [], "existing": [], "failed": []}
+        for collection_name, indexes in INDEXES.items():
+            collection = self.db[collection_name]
+            try:
+                existing = await collection.index_information()
+            except Exception as e:
+                logger.error(f"Error reading indexes for {collection_name}: {e}")
+                report["failed"].extend(f"{collection_name}.{options['name']}" for _, options in indexes)
+                continue
+            # Match on key pattern too, an equivalent index may exist under another name
+            existing_keys = {
+                tuple((field, direction if isinstance(direction, str) else int(direction)) for field, direction in info["key"])
+                for info in existing.values()
+            }
+            
+            for keys, options in indexes:
+                label = f"{collection_name}.{options['name']}"
+                if options["name"] in existing or tuple(keys) in existing_keys:
+                    report["existing"].append(label)
+                    continue
+                try:
+                    await collection.create_index(keys, **options)
+                    report["created"].append(label)
+                except Exception as e:
+                    # e.g. duplicate ids blocking a unique index; keep going with the rest
+                    logger.error(f"Error creating index {label}: {e}")
+                    report["failed"].append(label)
+        return report
+    
+    async def _list_page(self, collection, query: Dict[str, Any], limit: int, cursor: Optional[str],
+                         label: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One keyset page of a collection, newest first, plus the cursor for the next page.
+        
+        Raises ValueError for a malformed cursor.
+        """
+        query = self._page_query(query, cursor)
+        try:
+            return await self._fetch_page(collection, query, limit, PROJECTIONS[collection.name])
+        except Exception as e:
+            logger.error(f"Error fetching {label}: {e}")
+            return [], None
+    
+    @staticmethod
+    def _page_query(query: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+        if not cursor:
+            return query
+        created_at, last_id = decode_page_cursor(cursor)
+        after = keyset_filter(created_at, last_id)
+        return {"$and": [query, after]} if query else after
+    
+    async def _fetch_page(self, collection, query: Dict[str, Any], limit: int,
+                          projection: Dict[str, int]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        # Fetch one extra document to learn whether there is a next page
+        docs = await collection.find(query, projection).sort(LIST_SORT).limit(limit + 1).to_list(limit + 1)
+        if len(docs) > limit:
+            return docs[:limit], encode_page_cursor(docs[limit - 1])
+        return docs, None
     
     # Services Collection
     async def get_all_services(self) -> List[Dict[str, Any]]:
         try:
-            services = await self.db.services.find().to_list(1000)
-            return services
+            return await self.cache.get("services", "all", lambda: self.db.services.find({}, PROJECTIONS["services"]).to_list(1000))
         except Exception as e:
             logger.error(f"Error fetching services: {e}")
             return []
     
     async def get_service_by_id(self, service_id: str) -> Optional[Dict[str, Any]]:
         try:
-            service = await self.db.services.find_one({"id": service_id})
-            return service
+            return await self.cache.get("services", ("id", service_id),
+                                        lambda: self.db.services.find_one({"id": service_id}, PROJECTIONS["services"]))
         except Exception as e:
             logger.error(f"Error fetching service {service_id}: {e}")
             return None
@@ -36,28 +179,160 @@ class Database:
     async def create_service(self, service: Service) -> str:
         try:
             result = await self.db.services.insert_one(service.dict())
+            await self._collection_changed("services")
             return service.id
         except Exception as e:
             logger.error(f"Error creating service: {e}")
             raise e
     
     # Reviews Collection
-    async def get_all_reviews(self) -> List[Dict[str, Any]]:
+    async def get_reviews_page(self, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        query = self._page_query({"approved": True}, cursor)
         try:
-            reviews = await self.db.reviews.find({"approved": True}).sort("created_at", -1).to_list(1000)
-            return reviews
+            return await self.cache.get("reviews", (limit, cursor), lambda: self._fetch_page(self.db.reviews, query, limit, PROJECTIONS["reviews"]))
         except Exception as e:
             logger.error(f"Error fetching reviews: {e}")
+            return [], None
+    
+    async def get_review_markers(self, bbox=None, near=None, max_distance: Optional[float] = None,
+                                 limit: int = 500) -> List[Dict[str, Any]]:
+        """Lean map markers for approved reviews inside bbox, or nearest first to near=(lat, lng)"""
+        query: Dict[str, Any] = {"approved": True}
+        if near is not None:
+            query.update(near_filter(near[0], near[1], max_distance))
+        elif bbox is not None:
+            query.update(bbox_filter(bbox))
+        try:
+            docs = await self.db.reviews.find(query, MARKER_PROJECTION).limit(limit).to_list(limit)
+            return [marker(doc) for doc in docs]
+        except Exception as e:
+            logger.error(f"Error fetching review markers: {e}")
+            return []
+    
+    async def get_review_points(self) -> Optional[List[Dict[str, Any]]]:
+        """id, location and rating of every mappable approved review, for the cluster index"""
+        try:
+            return await self.cache.get("reviews", "points", lambda: self.db.reviews.find(
+                {"approved": True, "location": {"$exists": True}}, POINT_PROJECTION).to_list(None))
+        except Exception as e:
+            logger.error(f"Error fetching review points: {e}")
+            return None
+    
+    async def get_review_search_docs(self) -> Optional[List[Dict[str, Any]]]:
+        """Approved reviews with the fields the search index needs"""
+        try:
+            return await self.cache.get("reviews", "search", lambda: self.db.reviews.find(
+                {"approved": True}, SEARCH_PROJECTION).to_list(None))
+        except Exception as e:
+            logger.error(f"Error fetching reviews for search: {e}")
+            return None
+    
+    async def backfill_review_locations(self) -> int:
+        """Give reviews stored with only lat/lng their GeoJSON location"""
+        result = await self.db.reviews.update_many(BACKFILL_FILTER, BACKFILL_UPDATE)
+        if result.modified_count:
+            await self._collection_changed("reviews")
+        return result.modified_count
+    
+    async def get_review_stats(self) -> Optional[Dict[str, Any]]:
+        """Rating histogram, average and per postcode/service counts for approved reviews"""
+        try:
+            return await self.cache.get("reviews", "stats", self._aggregate_review_stats)
+        except Exception as e:
+            logger.error(f"Error aggregating review stats: {e}")
+            return None
+    
+    async def _aggregate_review_stats(self) -> Dict[str, Any]:
+        image_count = {"$size": {"$ifNull": ["$images", []]}}
+        def breakdown(field):
+            return [
+                {"$group": {"_id": f"${field}", "count": {"$sum": 1}, "average_rating": {"$avg": "$rating"}}},
+                {"$sort": {"count": -1, "_id": 1}},
+            ]
+        pipeline = [
+            {"$match": {"approved": True}},
+            {"$facet": {
+                "summary": [{"$group": {
+                    "_id": None,
+                    "count": {"$sum": 1},
+                    "average_rating": {"$avg": "$rating"},
+                    "with_images": {"$sum": {"$cond": [{"$gt": [image_count, 0]}, 1, 0]}},
+                    "images": {"$sum": image_count},
+                }}],
+                "ratings": [{"$group": {"_id": {"$floor": "$rating"}, "count": {"$sum": 1}}}],
+                "postcodes": breakdown("postcode"),
+                "services": breakdown("service"),
+            }},
+        ]
+        result = (await self.db.reviews.aggregate(pipeline).to_list(1))[0]
+        summary = result["summary"][0] if result["summary"] else {}
+        
+        histogram = {str(score): 0 for score in range(10, 0, -1)}
+        for bucket in result["ratings"]:
+            if bucket["_id"] is not None:
+                histogram[str(int(bucket["_id"]))] = bucket["count"]
+        
+        def rows(buckets, key):
+            return [{key: b["_id"], "count": b["count"], "average_rating": round(b["average_rating"] or 0, 2)} for b in buckets]
+        
+        return {
+            "total_reviews": summary.get("count", 0),
+            "average_rating": round(summary.get("average_rating") or 0, 2),
+            "rating_histogram": histogram,
+            "reviews_with_images": summary.get("with_images", 0),
+            "total_images": summary.get("images", 0),
+            "by_postcode": rows(result["postcodes"], "postcode"),
+            "by_service": rows(result["services"], "service"),
+        }
+    
+    async def get_review_image_urls(self) -> List[str]:
+        """Every distinct image URL attached to an approved review"""
+        try:
+            return await self.db.reviews.distinct("images", {"approved": True})
+        except Exception as e:
+            logger.error(f"Error fetching review image URLs: {e}")
             return []
     
     async def create_review(self, review: Review) -> str:
         try:
-            result = await self.db.reviews.insert_one(review.dict())
+            result = await self.db.reviews.insert_one(with_location(review.dict()))
+            await self._collection_changed("reviews")
             return review.id
         except Exception as e:
             logger.error(f"Error creating review: {e}")
             raise e
     
+    async def ingest_reviews(self, reviews: List[Dict[str, Any]], source: str, prune: bool = True,
+                             dry_run: bool = False) -> Dict[str, int]:
+        """Make the stored reviews from source match reviews, writing only the differences.
+        
+        Reviews are matched on their natural key (see review_ingest), changes are
+        applied as unordered bulk writes and, with prune, reviews from source that
+        are no longer in the import are deleted. Returns counts of each.
+        """
+        existing = await self.db.reviews.find(ingest_scope(source), INGEST_PROJECTION).to_list(None)
+        inserts, updates, deletes, unchanged = plan_ingest(existing, reviews, source, prune)
+        report = {"inserted": len(inserts), "updated": len(updates), "deleted": len(deletes),
+                  "unchanged": unchanged, "errors": 0}
+        if dry_run:
+            return report
+        
+        operations = [InsertOne(doc) for doc in inserts]
+        operations += [UpdateOne({"id": review_id}, {"$set": fields}) for review_id, fields in updates]
+        operations += [DeleteMany({"id": {"$in": deletes[i:i + INGEST_BATCH_SIZE]}})
+                       for i in range(0, len(deletes), INGEST_BATCH_SIZE)]
+        for i in range(0, len(operations), INGEST_BATCH_SIZE):
+            try:
+                await self.db.reviews.bulk_write(operations[i:i + INGEST_BATCH_SIZE], ordered=False)
+            except BulkWriteError as e:
+                # Unordered, so the rest of the batch was still applied
+                report["errors"] += len(e.details.get("writeErrors", []))
+                logger.error(f"Review ingest batch had {len(e.details.get('writeErrors', []))} write errors: "
+                             f"{e.details.get('writeErrors', [])[:3]}")
+        if operations:
+            await self._collection_changed("reviews")
+        return report
+    
     # Quote Requests Collection
     async def create_quote_request(self, quote: QuoteRequest) -> str:
         try:
@@ -67,13 +342,8 @@ class Database:
             logger.error(f"Error creating quote request: {e}")
             raise e
     
-    async def get_all_quote_requests(self) -> List[Dict[str, Any]]:
-        try:
-            quotes = await self.db.quote_requests.find().sort("created_at", -1).to_list(1000)
-            return quotes
-        except Exception as e:
-            logger.error(f"Error fetching quote requests: {e}")
-            return []
+    async def get_quote_requests_page(self, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        return await self._list_page(self.db.quote_requests, {}, limit, cursor, "quote requests")
     
     # Contacts Collection
     async def create_contact(self, contact: Contact) -> str:
@@ -84,22 +354,12 @@ class Database:
             logger.error(f"Error creating contact: {e}")
             raise e
     
-    async def get_all_contacts(self) -> List[Dict[str, Any]]:
-        try:
-            contacts = await self.db.contacts.find().sort("created_at", -1).to_list(1000)
-            return contacts
-        except Exception as e:
-            logger.error(f"Error fetching contacts: {e}")
-            return []
+    async def get_contacts_page(self, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        return await self._list_page(self.db.contacts, {}, limit, cursor, "contacts")
     
     # Gallery Collection
-    async def get_all_gallery_images(self) -> List[Dict[str, Any]]:
-        try:
-            images = await self.db.gallery.find().sort("created_at", -1).to_list(1000)
-            return images
-        except Exception as e:
-            logger.error(f"Error fetching gallery images: {e}")
-            return []
+    async def get_gallery_images_page(self, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        return await self._list_page(self.db.gallery, {}, limit, cursor, "gallery images")
     
     async def create_gallery_image(self, image: GalleryImage) -> str:
         try:
@@ -120,91 +380,8 @@ class Database:
                 return
             
             # Seed services
-            services_data = [
-                {
-                    "id": "1",
-                    "title": "Garden Maintenance",
-                    "description": "Comprehensive garden maintenance including lawn mowing, hedge trimming, weeding, and general upkeep. Professional service to keep your garden looking its best all year round.",
-                    "image": "https://customer-assets.emergentagent.com/job_balham-gardening-hub/artifacts/iavpo09s_Garden%20Maintenance.jpeg",
-                    "features": ["Lawn Mowing", "Hedge Trimming", "Weeding", "General Upkeep", "Seasonal Maintenance"],
-                    "created_at": "2024-01-01T00:00:00",
-                    "updated_at": "2024-01-01T00:00:00"
-                },
-                {
-                    "id": "2",
-                    "title": "Garden Clearance",
-                    "description": "Complete garden clearance services including removal of overgrown vegetation, waste disposal, and site preparation. Fast and efficient clearance with professional waste removal.",
-                    "image": "https://customer-assets.emergentagent.com/job_balham-gardening-hub/artifacts/tu9u2wbq_Garden%20Clearance.jpeg",
-                    "features": ["Overgrown Garden Clearance", "Waste Removal", "Site Preparation", "Ivy Removal", "Thorny Bush Disposal"],
-                    "created_at": "2024-01-01T00:00:00",
-                    "updated_at": "2024-01-01T00:00:00"
-                },
-                {
-                    "id": "3",
-                    "title": "Hedge Trimming & Removal",
-                    "description": "Professional hedge trimming and removal services. Expert maintenance to keep your hedges neat and healthy, or complete removal when needed.",
-                    "image": "https://customer-assets.emergentagent.com/job_balham-gardening-hub/artifacts/ccw4wf98_Hedge%20Trimming.jpeg",
-                    "features": ["Hedge Trimming", "Hedge Removal", "Hedge Shaping", "Pruning", "Cleanup Service"],
-                    "created_at": "2024-01-01T00:00:00",
-                    "updated_at": "2024-01-01T00:00:00"
-                },
-                {
-                    "id": "4",
-                    "title": "Turfing",
-                    "description": "Professional turf laying services to create beautiful, lush lawns. From ground preparation to final installation of premium quality turf.",
-                    "image": "https://customer-assets.emergentagent.com/job_balham-gardening-hub/artifacts/p467qw39_Turfing.jpeg",
-                    "features": ["Ground Preparation", "Turf Installation", "Lawn Creation", "Soil Treatment", "Aftercare Advice"],
-                    "created_at": "2024-01-01T00:00:00",
-                    "updated_at": "2024-01-01T00:00:00"
-                },
-                {
-                    "id": "5",
-                    "title": "Lawn Care",
-                    "description": "Professional lawn care services including mowing, edging, weed treatment, and overseeding. Keep your lawn healthy and beautiful throughout the year.",
-                    "image": "https://customer-assets.emergentagent.com/job_balham-gardening-hub/artifacts/84y7gk19_Lawn%20Care.jpeg",
-                    "features": ["Lawn Mowing", "Edging", "Weed Treatment", "Overseeding", "Lawn Health Assessment"],
-                    "created_at": "2024-01-01T00:00:00",
-                    "updated_at": "2024-01-01T00:00:00"
-                },
-                {
-                    "id": "6",
-                    "title": "Planting Services",
-                    "description": "Expert planting schemes to suit your space and style. Professional plant selection, installation, and ongoing care to create beautiful garden displays.",
-                    "image": "https://images.unsplash.com/photo-1416879595882-3373a0480b5b?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzh8MHwxfHNlYXJjaHw2fHxwbGFudGluZ3xlbnwwfHx8fDE3NTQ4Mzc5NDJ8MA&ixlib=rb-4.1.0&q=85",
-                    "features": ["Plant Selection", "Flower Bed Design", "Seasonal Planting", "Bulb Planting", "Plant Care Advice"],
-                    "created_at": "2024-01-01T00:00:00",
-                    "updated_at": "2024-01-01T00:00:00"
-                },
-                {
-                    "id": "7",
-                    "title": "Patio Services",
-                    "description": "Professional patio installation, repair, and maintenance. From new patio construction to pressure washing and restoration of existing patios.",
-                    "image": "https://images.unsplash.com/photo-1600585154340-be6161a56a0c?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzh8MHwxfHNlYXJjaHw1fHxwYXRpb3xlbnwwfHx8fDE3NTQ4Mzc5NDJ8MA&ixlib=rb-4.1.0&q=85",
-                    "features": ["Patio Installation", "Patio Repair", "Pressure Washing", "Stone & Block Paving", "Patio Design"],
-                    "created_at": "2024-01-01T00:00:00",
-                    "updated_at": "2024-01-01T00:00:00"
-                },
-                {
-                    "id": "8",
-                    "title": "Pruning",
-                    "description": "Expert pruning services for trees, shrubs, and plants. Professional techniques to promote healthy growth and maintain the shape and size of your plants.",
-                    "image": "https://images.unsplash.com/photo-1515150144380-bca9f1650ed9?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Nzd8MHwxfHNlYXJjaHwyfHxnYXJkZW5pbmd8ZW58MHx8fHwxNzU0ODM3OTM2fDA&ixlib=rb-4.1.0&q=85",
-                    "features": ["Tree Pruning", "Shrub Pruning", "Seasonal Pruning", "Health Assessment", "Shape Maintenance"],
-                    "created_at": "2024-01-01T00:00:00",
-                    "updated_at": "2024-01-01T00:00:00"
-                },
-                {
-                    "id": "9",
-                    "title": "Trellis & Fencing",
-                    "description": "Professional trellis installation and fencing services. Custom solutions for privacy, plant support, and garden structure. Quality materials and expert installation.",
-                    "image": "https://images.unsplash.com/photo-1585128792020-803d29415281?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzh8MHwxfHNlYXJjaHw3fHx0cmVsbGlzfGVufDB8fHx8MTc1NDgzNzk0Mnww&ixlib=rb-4.1.0&q=85",
-                    "features": ["Trellis Installation", "Garden Fencing", "Privacy Screens", "Plant Support Systems", "Custom Design"],
-                    "created_at": "2024-01-01T00:00:00",
-                    "updated_at": "2024-01-01T00:00:00"
-                }
-            ]
-            
-            await self.db.services.insert_many(services_data)
+            await self.db.services.insert_many([dict(service) for service in SEED_SERVICES])
+            await self._collection_changed("services")
             
             # Seed reviews - Use existing reviews dataset
             all_reviews = [
@@ -285,38 +462,7 @@ class Database:
             logger.info(f"Review seeding disabled - use add_all_reviews.py script")
             
             # Seed gallery images
-            gallery_data = [
-                {
-                    "id": "1",
-                    "src": "https://images.unsplash.com/photo-1597201278257-3687be27d954?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzh8MHwxfHNlYXJjaHw0fHxsYW5kc2NhcGluZ3xlbnwwfHx8fDE3NTQ4Mzc5NDJ8MA&ixlib=rb-4.1.0&q=85",
-                    "title": "Beautiful Flower Garden",
-                    "category": "Garden Design",
-                    "created_at": "2024-01-01T00:00:00"
-                },
-                {
-                    "id": "2",
-                    "src": "https://images.pexels.com/photos/5905352/pexels-photo-5905352.jpeg",
-                    "title": "Professional Garden Work",
-                    "category": "Maintenance",
-                    "created_at": "2024-01-01T00:00:00"
-                },
-                {
-                    "id": "3",
-                    "src": "https://images.pexels.com/photos/1301856/pexels-photo-1301856.jpeg",
-                    "title": "Tree Surgery",
-                    "category": "Tree Care",
-                    "created_at": "2024-01-01T00:00:00"
-                },
-                {
-                    "id": "4",
-                    "src": "https://images.unsplash.com/photo-1458245201577-fc8a130b8829?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzh8MHwxfHNlYXJjaHwzfHxsYW5kc2NhcGluZ3xlbnwwfHx8fDE3NTQ4Mzc5NDJ8MA&ixlib=rb-4.1.0&q=85",
-                    "title": "Lawn Maintenance",
-                    "category": "Lawn Care",
-                    "created_at": "2024-01-01T00:00:00"
-                }
-            ]
-            
-            await self.db.gallery.insert_many(gallery_data)
+            await self.db.gallery.insert_many([dict(image) for image in SEED_GALLERY])
             
             logger.info("Database seeded successfully with initial data")
             
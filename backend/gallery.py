@@ -0,0 +1,312 @@
+"""
+In-memory serving of the real Google Drive gallery dataset.
+
+real_gallery_data.json is loaded once and kept as a parsed snapshot. The full
+dataset response (with image metadata folded into each picture) is serialized
+and gzip-compressed once per snapshot and metadata version, under an ETag keyed
+on both. The file is only re-read when its mtime/size changes, and only
+re-parsed when its content hash changes, so a request is just a memory write.
+"""
+import asyncio
+import base64
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from image_keys import canonical_image_key
+
+logger = logging.getLogger(__name__)
+
+GALLERY_DATA_PATH = os.environ.get('GALLERY_DATA_PATH', '/app/real_gallery_data.json')
+GALLERY_REBUILD_SCRIPT = os.environ.get('GALLERY_REBUILD_SCRIPT', '/app/create_gallery_data.py')
+
+GALLERY_SORTS = ('default', 'newest', 'oldest', 'name')
+
+def encode_cursor(sort: str, last_id: str, offset: int) -> str:
+    raw = json.dumps({'s': sort, 'id': last_id, 'o': offset}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Decode an opaque page cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return {'s': str(data['s']), 'id': str(data['id']), 'o': int(data['o'])}
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def is_image_photo(photo: Dict[str, Any]) -> bool:
+    """Whether a gallery entry is a picture; the dataset also lists videos"""
+    return str(photo.get('mime_type') or '').startswith('image/')
+
+def photo_metadata_key(photo: Dict[str, Any]) -> Optional[str]:
+    """Image metadata index key of a gallery picture; videos have no metadata"""
+    return canonical_image_key(photo.get('url', '')) if is_image_photo(photo) else None
+
+class AlbumIndex:
+    """Precomputed orderings of one album's photos"""
+
+    def __init__(self, album: Dict[str, Any]):
+        photos = album.get('photos', [])
+        self.name = album.get('service_name')
+        self.orders: Dict[str, List[Dict[str, Any]]] = {
+            'default': photos,
+            'newest': sorted(photos, key=lambda p: p.get('created', ''), reverse=True),
+            'oldest': sorted(photos, key=lambda p: p.get('created', '')),
+            'name': sorted(photos, key=lambda p: p.get('name', '').lower()),
+        }
+        # Position of each photo id in each ordering, so cursors survive reloads
+        self.positions: Dict[str, Dict[str, int]] = {
+            sort: {photo.get('id'): i for i, photo in enumerate(ordered)}
+            for sort, ordered in self.orders.items()
+        }
+        cover = photos[0] if photos else None
+        self.summary = {
+            'service_name': self.name,
+            'photo_count': len(photos),
+            'description': album.get('description', ''),
+            'cover_photo': album.get('cover_photo') or (cover.get('url') if cover else None),
+            'cover_thumbnail': cover.get('thumbnail_url') if cover else None,
+        }
+
+    def page(self, sort: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        ordered = self.orders[sort]
+        start = 0
+        if cursor:
+            position = decode_cursor(cursor)
+            if position['s'] != sort:
+                raise ValueError("Cursor was issued for a different sort order")
+            last = self.positions[sort].get(position['id'])
+            # Fall back to the stored offset if the photo was removed since
+            start = last + 1 if last is not None else position['o']
+        photos = ordered[start:start + limit]
+        end = start + len(photos)
+        next_cursor = encode_cursor(sort, photos[-1].get('id'), end) if photos and end < len(ordered) else None
+        return photos, next_cursor
+
+class GalleryPayload:
+    """The full dataset response for one snapshot and metadata version"""
+
+    def __init__(self, snapshot: 'GallerySnapshot', metadata_index):
+        self.metadata_version = metadata_index.version
+        data = {
+            name: {**album, 'photos': metadata_index.annotate(album.get('photos', []), photo_metadata_key)}
+            for name, album in snapshot.data.items()
+        }
+        if self.metadata_version is None:
+            self.etag = snapshot.etag
+        else:
+            tag = hashlib.sha256(f"{snapshot.content_hash}:{self.metadata_version}".encode('ascii')).hexdigest()
+            self.etag = f'"{tag[:32]}"'
+        # Same encoding FastAPI's JSONResponse would produce
+        self.payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.gzip_payload = gzip.compress(self.payload, compresslevel=9)
+
+class GallerySnapshot:
+    """One immutable version of the gallery dataset"""
+
+    def __init__(self, data: Dict[str, Any], content_hash: str, mtime_ns: int, size: int):
+        self.data = data
+        self.content_hash = content_hash
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.etag = f'"{content_hash[:32]}"'
+        self.loaded_at = time.time()
+        self._payload: Optional[GalleryPayload] = None
+        self._payload_lock = asyncio.Lock()
+        # Album summaries and per-album orderings for the paginated endpoints
+        self.albums: Dict[str, AlbumIndex] = {
+            name: AlbumIndex({'service_name': name, **album}) for name, album in data.items()
+        }
+        self.albums_payload = json.dumps(
+            [index.summary for index in self.albums.values()], ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+
+    @property
+    def photo_count(self) -> int:
+        return sum(len(album.get('photos', [])) for album in self.data.values())
+
+    async def full_payload(self, metadata_index) -> GalleryPayload:
+        """The full dataset response, rebuilt only when the image metadata reloads"""
+        payload = self._payload
+        if payload is not None and payload.metadata_version == metadata_index.version:
+            return payload
+        async with self._payload_lock:
+            payload = self._payload
+            if payload is None or payload.metadata_version != metadata_index.version:
+                payload = self._payload = await asyncio.to_thread(GalleryPayload, self, metadata_index)
+            return payload
+
+class GalleryStore:
+    def __init__(self, path: str = GALLERY_DATA_PATH):
+        self.path = path
+        # How often to stat the file for changes; 0 checks on every request
+        self.check_interval = float(os.environ.get('GALLERY_RELOAD_CHECK_INTERVAL', 2.0))
+        self.snapshot: Optional[GallerySnapshot] = None
+        self.version = 0
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self, current: Optional[GallerySnapshot]) -> Optional[GallerySnapshot]:
+        """Read and (if the content changed) parse the dataset. Runs in a worker thread."""
+        stat = self._stat()
+        if stat is None:
+            return None
+        mtime_ns, size = stat
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        content_hash = hashlib.sha256(raw).hexdigest()
+        if current is not None and current.content_hash == content_hash:
+            # Touched but unchanged: keep the parsed snapshot, remember the new mtime
+            current.mtime_ns, current.size = mtime_ns, size
+            return current
+        return GallerySnapshot(json.loads(raw), content_hash, mtime_ns, size)
+
+    async def get_snapshot(self, force: bool = False) -> Optional[GallerySnapshot]:
+        """Return the current snapshot, reloading it if the file changed on disk"""
+        now = time.monotonic()
+        if not force and self.snapshot is not None and now - self._checked_at < self.check_interval:
+            return self.snapshot
+
+        async with self._lock:
+            if not force and self.snapshot is not None and now - self._checked_at < self.check_interval:
+                return self.snapshot
+            stat = self._stat()
+            current = self.snapshot
+            if stat is None:
+                # Keep serving the last good snapshot if the file disappears
+                self._checked_at = now
+                return current
+            if force or current is None or stat != (current.mtime_ns, current.size):
+                try:
+                    snapshot = await asyncio.to_thread(self._read, current)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Failed to load gallery data from {self.path}: {e}")
+                    snapshot = None
+                if snapshot is not None and snapshot is not current:
+                    self.snapshot = snapshot
+                    self.version += 1
+                    logger.info(f"Loaded gallery data v{self.version}: {len(snapshot.data)} albums, "
+                                f"{snapshot.photo_count} photos, {snapshot.size} bytes")
+            self._checked_at = now
+            return self.snapshot
+
+class GalleryRebuildJob:
+    """Runs the Drive crawl that regenerates the gallery dataset, one at a time.
+
+    The crawl runs as a subprocess awaited from a background task, so the event loop
+    keeps serving requests. An flock on a lock file next to the dataset makes sure only
+    one worker process owns a rebuild even when several are running. After a failed
+    rebuild, automatic restarts are refused for a cooldown so a broken crawl is not
+    retried on every request; start(force=True) bypasses it.
+    """
+
+    def __init__(self, store: GalleryStore, script: str = GALLERY_REBUILD_SCRIPT):
+        self.store = store
+        self.script = script
+        self.timeout = float(os.environ.get('GALLERY_REBUILD_TIMEOUT', 600))
+        self.failure_cooldown = float(os.environ.get('GALLERY_REBUILD_COOLDOWN', 300))
+        self.lock_path = f"{store.path}.rebuild.lock"
+        self._task: Optional[asyncio.Task] = None
+        self._failed_at: Optional[float] = None
+        self.status: Dict[str, Any] = {'state': 'idle', 'runs': 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def cooldown_remaining(self) -> float:
+        """Seconds until a failed rebuild may be restarted automatically"""
+        if self._failed_at is None:
+            return 0.0
+        return max(0.0, self._failed_at + self.failure_cooldown - time.monotonic())
+
+    def start(self, force: bool = False) -> bool:
+        """Start a rebuild unless one is already running or, without force, a recent
+        one failed. Returns True if this call started it."""
+        if self.running:
+            return False
+        if not force and self.cooldown_remaining() > 0:
+            return False
+        self.status = {
+            'state': 'running',
+            'runs': self.status.get('runs', 0) + 1,
+            'started_at': datetime.utcnow().isoformat(),
+            'finished_at': None,
+            'returncode': None,
+            'error': None,
+        }
+        self._task = asyncio.create_task(self._run())
+        return True
+
+    def _acquire_lock(self):
+        lock_file = open(self.lock_path, 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    async def _run(self):
+        lock_file = None
+        try:
+            lock_file = self._acquire_lock()
+            if lock_file is None:
+                # Another worker owns the rebuild; we will pick up its output on reload
+                self.status['state'] = 'running_elsewhere'
+                logger.info("Gallery rebuild already running in another worker")
+                return
+
+            logger.info(f"Starting gallery rebuild: {self.script}")
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, self.script,
+                cwd=os.path.dirname(self.script) or None,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise Exception(f"Gallery rebuild timed out after {self.timeout:.0f}s")
+
+            self.status['returncode'] = process.returncode
+            if process.returncode != 0:
+                raise Exception(f"Failed to create gallery data: {stderr.decode(errors='replace')[-2000:]}")
+
+            snapshot = await self.store.get_snapshot(force=True)
+            if snapshot is None:
+                raise Exception("Gallery data is still missing after rebuild")
+            self.status['state'] = 'succeeded'
+            self._failed_at = None
+            logger.info(f"Gallery rebuild complete: {snapshot.photo_count} photos")
+        except Exception as e:
+            self.status['state'] = 'failed'
+            self.status['error'] = str(e)
+            self._failed_at = time.monotonic()
+            logger.error(f"Gallery rebuild failed: {e}")
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+            self.status['finished_at'] = datetime.utcnow().isoformat()
+
+# Global gallery store and rebuild job instances
+gallery_store = GalleryStore()
+gallery_rebuild = GalleryRebuildJob(gallery_store)
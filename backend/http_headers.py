@@ -0,0 +1,40 @@
+"""
+Request header parsing shared by the endpoints that do their own conditional
+requests and content negotiation.
+"""
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match / If-Range list against our ETag"""
+    if header.strip() == '*':
+        return True
+    bare = etag.strip('"')
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"') == bare:
+            return True
+    return False
+
+def accepts_encoding(header: str, coding: str) -> bool:
+    """Whether an Accept-Encoding header allows coding, honouring q-values
+    (so 'gzip;q=0' refuses it) and a '*' wildcard"""
+    wildcard = None
+    for item in header.split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name == coding:
+            return quality > 0
+        if name == '*':
+            wildcard = quality
+    return wildcard is not None and wildcard > 0
@@ -0,0 +1,271 @@
+"""
+Two-tier cache for proxied images: a byte-bounded in-memory LRU for hot
+thumbnails in front of a size-capped on-disk store for everything else.
+
+Each worker process keeps its own index of the shared cache directory, so the
+IMAGE_CACHE_MEMORY_BYTES and IMAGE_CACHE_DISK_BYTES caps apply per worker: with
+N workers the directory can grow to N times the disk cap.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from email.utils import formatdate
+from pathlib import Path
+from typing import Any, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVICTION_POLICIES = ('lru', 'fifo')
+
+class CachedImage:
+    """Image bytes plus the validators we serve on a hit"""
+
+    def __init__(self, content: bytes, content_type: str = 'image/jpeg',
+                 etag: Optional[str] = None, last_modified: Optional[str] = None,
+                 digest: Optional[str] = None, source_digest: Optional[str] = None):
+        self.content = content
+        self.content_type = content_type
+        # Upstream ETag, kept for reference; clients get our strong content ETag
+        self.etag = etag
+        self.last_modified = last_modified or formatdate(usegmt=True)
+        self._digest = digest
+        # For derivatives, the digest of the original they were rendered from
+        self.source_digest = source_digest
+
+    @property
+    def digest(self) -> str:
+        """Content hash, computed on first use"""
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.content).hexdigest()[:32]
+        return self._digest
+
+    @property
+    def strong_etag(self) -> str:
+        return f'"{self.digest}"'
+
+    @property
+    def size(self) -> int:
+        return len(self.content)
+
+    def meta(self) -> Dict[str, Any]:
+        return {
+            'content_type': self.content_type,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'digest': self.digest,
+            'source_digest': self.source_digest,
+        }
+
+class ImageCache:
+    def __init__(self):
+        self.memory_max_bytes = int(os.environ.get('IMAGE_CACHE_MEMORY_BYTES', 64 * 1024 * 1024))
+        self.memory_max_entry_bytes = int(os.environ.get('IMAGE_CACHE_MEMORY_ENTRY_BYTES', 512 * 1024))
+        # Per worker process, see the module docstring
+        self.disk_max_bytes = int(os.environ.get('IMAGE_CACHE_DISK_BYTES', 1024 * 1024 * 1024))
+        self.max_entry_bytes = int(os.environ.get('IMAGE_CACHE_MAX_ENTRY_BYTES', 25 * 1024 * 1024))
+        self.disk_dir = Path(os.environ.get('IMAGE_CACHE_DIR', '/tmp/pnm_image_cache'))
+        self.eviction = os.environ.get('IMAGE_CACHE_EVICTION', 'lru').lower()
+        if self.eviction not in EVICTION_POLICIES:
+            logger.warning(f"Unknown IMAGE_CACHE_EVICTION '{self.eviction}', falling back to lru")
+            self.eviction = 'lru'
+
+        self._memory: "OrderedDict[str, CachedImage]" = OrderedDict()
+        self._memory_bytes = 0
+        # Disk index: file stem -> size, ordered oldest first
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._disk_ready = False
+        self._disk_index_lock = asyncio.Lock()
+        self._lock = asyncio.Lock()
+
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+        }
+
+    # Helpers
+    @staticmethod
+    def _stem(key: str) -> str:
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _paths(self, stem: str):
+        return self.disk_dir / f"{stem}.bin", self.disk_dir / f"{stem}.json"
+
+    def _load_disk_index(self):
+        """Rebuild the disk index from what survived the last run, oldest first"""
+        self.disk_dir.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self.disk_dir.glob('*.bin'):
+            try:
+                stat = path.stat()
+                entries.append((stat.st_mtime, path.stem, stat.st_size))
+            except OSError:
+                continue
+        # Built from scratch, never added to, so the counters can't be double counted
+        self._disk = OrderedDict((stem, size) for _, stem, size in sorted(entries))
+        self._disk_bytes = sum(self._disk.values())
+        self._disk_ready = True
+        logger.info(f"Image disk cache loaded: {len(self._disk)} entries, {self._disk_bytes} bytes")
+
+    async def _ensure_disk_index(self):
+        """Load the disk index once, however many first requests arrive together"""
+        if self._disk_ready:
+            return
+        async with self._disk_index_lock:
+            if not self._disk_ready:
+                await asyncio.to_thread(self._load_disk_index)
+
+    def _touch(self, store: OrderedDict, key: str):
+        if self.eviction == 'lru':
+            store.move_to_end(key)
+
+    # Memory tier
+    def _memory_put(self, key: str, image: CachedImage):
+        if image.size > self.memory_max_entry_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old.size
+        self._memory[key] = image
+        self._memory_bytes += image.size
+        while self._memory_bytes > self.memory_max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.size
+            self.stats['memory_evictions'] += 1
+
+    # Disk tier (blocking, run in a worker thread)
+    def _disk_read(self, stem: str) -> Optional[CachedImage]:
+        data_path, meta_path = self._paths(stem)
+        try:
+            content = data_path.read_bytes()
+            meta = json.loads(meta_path.read_text())
+            if self.eviction == 'lru':
+                os.utime(data_path)
+            return CachedImage(content, **meta)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_write(self, stem: str, image: CachedImage):
+        """Write through temp files (named per process, since workers share the
+        directory) and rename them into place, meta first, so a reader never sees
+        a half-written file"""
+        data_path, meta_path = self._paths(stem)
+        data_tmp = data_path.with_suffix(f'.bin.{os.getpid()}.tmp')
+        meta_tmp = meta_path.with_suffix(f'.json.{os.getpid()}.tmp')
+        data_tmp.write_bytes(image.content)
+        meta_tmp.write_text(json.dumps(image.meta()))
+        os.replace(meta_tmp, meta_path)
+        os.replace(data_tmp, data_path)
+
+    def _disk_delete(self, stem: str):
+        for path in self._paths(stem):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    # Public API
+    async def get(self, key: str) -> Optional[CachedImage]:
+        image = self._memory.get(key)
+        if image is not None:
+            self._touch(self._memory, key)
+            self.stats['memory_hits'] += 1
+            return image
+
+        await self._ensure_disk_index()
+        stem = self._stem(key)
+        if stem in self._disk:
+            image = await asyncio.to_thread(self._disk_read, stem)
+            if image is not None:
+                self._touch(self._disk, stem)
+                self.stats['disk_hits'] += 1
+                self._memory_put(key, image)
+                return image
+            # Files vanished or are unreadable (e.g. a crash between the two
+            # renames): remove what is left so it does not linger outside the index
+            async with self._lock:
+                if stem in self._disk:
+                    self._disk_bytes -= self._disk.pop(stem)
+                    await asyncio.to_thread(self._disk_delete, stem)
+
+        self.stats['misses'] += 1
+        return None
+
+    async def contains(self, key: str) -> bool:
+        """Check for an entry without reading it or touching hit/miss counters"""
+        if key in self._memory:
+            return True
+        await self._ensure_disk_index()
+        return self._stem(key) in self._disk
+
+    async def put(self, key: str, image: CachedImage):
+        if image.size > self.max_entry_bytes:
+            return
+        self._memory_put(key, image)
+        self.stats['stores'] += 1
+
+        async with self._lock:
+            await self._ensure_disk_index()
+            stem = self._stem(key)
+            try:
+                await asyncio.to_thread(self._disk_write, stem, image)
+            except OSError as e:
+                logger.error(f"Failed to write image cache entry: {e}")
+                return
+            self._disk_bytes -= self._disk.pop(stem, 0)
+            self._disk[stem] = image.size
+            self._disk_bytes += image.size
+
+            evicted = []
+            while self._disk_bytes > self.disk_max_bytes and len(self._disk) > 1:
+                old_stem, old_size = self._disk.popitem(last=False)
+                self._disk_bytes -= old_size
+                evicted.append(old_stem)
+            if evicted:
+                self.stats['disk_evictions'] += len(evicted)
+                await asyncio.to_thread(lambda: [self._disk_delete(s) for s in evicted])
+
+    async def size_of(self, key: str) -> Optional[int]:
+        """Stored size of an entry, without reading it"""
+        image = self._memory.get(key)
+        if image is not None:
+            return image.size
+        await self._ensure_disk_index()
+        return self._disk.get(self._stem(key))
+
+    async def discard(self, key: str):
+        """Drop an entry from both tiers"""
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old.size
+        async with self._lock:
+            await self._ensure_disk_index()
+            stem = self._stem(key)
+            if stem in self._disk:
+                self._disk_bytes -= self._disk.pop(stem)
+                await asyncio.to_thread(self._disk_delete, stem)
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        lookups = hits + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+            'eviction_policy': self.eviction,
+            'memory_entries': len(self._memory),
+            'memory_bytes': self._memory_bytes,
+            'memory_max_bytes': self.memory_max_bytes,
+            'disk_entries': len(self._disk),
+            'disk_bytes': self._disk_bytes,
+            'disk_max_bytes': self.disk_max_bytes,
+        }
+
+# Global image cache instance
+image_cache = ImageCache()
@@ -0,0 +1,210 @@
+"""
+Single-flight coalescing for upstream image downloads.
+
+Concurrent requests for the same key share one in-flight download. The download
+runs in its own task, so it is not tied to whichever client happened to start it,
+and every reader replays the buffered chunks from the beginning before following
+the live stream.
+
+A flight that grows too large to cache is detached: new requests no longer join
+it, and chunks are dropped once every reader has streamed past them, so memory
+stays bounded by how far the slowest reader lags rather than by the image size.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Flight:
+    """One shared upstream download"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.status_code: Optional[int] = None
+        self.headers: Dict[str, str] = {}
+        self.chunks: List[bytes] = []
+        # Chunks already dropped from the front of chunks once buffering stopped
+        self.offset = 0
+        self.buffering = True
+        self.size = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.readers = 0
+        # Callers that joined but have not started reading yet; they need the buffer intact
+        self.pending = 0
+        self._positions: Dict[int, int] = {}
+        self._next_reader = 0
+        self._started = asyncio.Event()
+        self._changed = asyncio.Condition()
+
+    # Producer side
+    def start(self, status_code: int, headers: Dict[str, str]):
+        self.status_code = status_code
+        self.headers = headers
+        self._started.set()
+
+    async def feed(self, chunk: bytes):
+        async with self._changed:
+            self.chunks.append(chunk)
+            self.size += len(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None):
+        async with self._changed:
+            self.error = error
+            self.done = True
+            # Wake anyone still waiting for headers as well as chunk readers
+            self._started.set()
+            self._changed.notify_all()
+
+    def stop_buffering(self):
+        """Keep only the chunks that some reader has yet to stream"""
+        self.buffering = False
+        self._trim()
+
+    def _trim(self):
+        if self.buffering or self.pending:
+            return
+        low = min(self._positions.values(), default=self.offset + len(self.chunks))
+        if low > self.offset:
+            del self.chunks[:low - self.offset]
+            self.offset = low
+
+    def release(self):
+        """Give up a joined caller's claim on the buffered chunks"""
+        self.pending -= 1
+        self._trim()
+
+    @property
+    def content(self) -> bytes:
+        if self.offset:
+            raise RuntimeError(f"Flight {self.key} stopped buffering, its content is incomplete")
+        return b''.join(self.chunks)
+
+    # Consumer side
+    async def wait_started(self):
+        """Wait for upstream headers; re-raises the upstream error if it failed first"""
+        await self._started.wait()
+        if self.status_code is None:
+            raise self.error or RuntimeError("Upstream fetch ended without a response")
+
+    async def peek(self, size: int) -> bytes:
+        """The first size bytes of the download (fewer if it is shorter), once they arrive"""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.size >= size or self.done)
+        # Chunks are only trimmed once every joined caller has started reading
+        head = b''
+        for chunk in self.chunks:
+            if len(head) >= size:
+                break
+            head += chunk
+        return head[:size]
+
+    async def wait_finished(self):
+        """Wait for the download to end without holding on to its bytes"""
+        self.release()
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.done)
+        if self.error is not None:
+            raise self.error
+
+    async def result(self) -> bytes:
+        """Wait for the whole download and return its bytes"""
+        try:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.done)
+            if self.error is not None:
+                raise self.error
+            return self.content
+        finally:
+            self.release()
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        """Yield every chunk of the download, from the first one onwards"""
+        self.readers += 1
+        reader = self._next_reader
+        self._next_reader += 1
+        position = self._positions[reader] = 0
+        self.release()
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: self.offset + len(self.chunks) > position or self.done)
+                    pending = self.chunks[position - self.offset:]
+                    finished = self.done
+                for chunk in pending:
+                    yield chunk
+                position += len(pending)
+                self._positions[reader] = position
+                self._trim()
+                if finished and position >= self.offset + len(self.chunks):
+                    if self.error is not None:
+                        raise self.error
+                    return
+        finally:
+            self.readers -= 1
+            del self._positions[reader]
+            self._trim()
+
+class FlightGroup:
+    """Registry of in-flight downloads keyed by normalized URL"""
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self._tasks = set()
+        self.stats = {
+            'started': 0,
+            'coalesced': 0,
+            'failed': 0,
+        }
+
+    def join(self, key: str, fetch: Callable[[Flight], Awaitable[None]]) -> Tuple[Flight, bool]:
+        """Return the in-flight download for key, starting one if needed.
+
+        The bool is True when this caller started the download. Every caller must
+        consume the flight once, through iter_chunks, result or wait_finished.
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.stats['coalesced'] += 1
+            flight.pending += 1
+            return flight, False
+
+        flight = Flight(key)
+        flight.pending += 1
+        self._flights[key] = flight
+        self.stats['started'] += 1
+        task = asyncio.create_task(self._run(flight, fetch))
+        # Keep a strong reference so the task is not garbage collected mid-download
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return flight, True
+
+    async def _run(self, flight: Flight, fetch: Callable[[Flight], Awaitable[None]]):
+        error = None
+        try:
+            await fetch(flight)
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.error(f"Upstream fetch failed for {flight.key}: {e}")
+            error = e
+        finally:
+            # Drop the flight before waking readers so later requests start afresh
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            await flight.finish(error)
+
+    def detach(self, flight: Flight):
+        """Stop new requests from joining a flight (e.g. when it grows too large to buffer)
+        and drop its chunks as soon as the current readers have streamed them"""
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+        flight.stop_buffering()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'in_flight': len(self._flights),
+            'readers': sum(f.readers for f in self._flights.values()),
+        }
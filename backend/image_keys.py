@@ -0,0 +1,127 @@
+"""
+Stable cache identities for upstream image URLs.
+
+Checkatrade review images are signed Google Cloud Storage URLs whose
+GoogleAccessId/Expires/Signature parameters change on every re-scrape, and
+Drive photos are reachable through several URL shapes. Caching by the raw URL
+would throw everything away each time, so we key by the underlying object.
+"""
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit, urlunsplit
+
+GCS_HOST = 'storage.googleapis.com'
+DRIVE_HOSTS = ('drive.google.com', 'docs.google.com')
+
+# Query parameters that only carry the signature, never the object identity
+SIGNATURE_PARAMS = {'googleaccessid', 'expires', 'signature'}
+SIGNATURE_PARAM_PREFIX = 'x-goog-'
+
+def _is_gcs(host: str) -> bool:
+    return host == GCS_HOST or host.endswith('.' + GCS_HOST)
+
+def _is_signature_param(name: str) -> bool:
+    name = name.lower()
+    return name in SIGNATURE_PARAMS or name.startswith(SIGNATURE_PARAM_PREFIX)
+
+def _drive_file_id(path: str, params: dict) -> Optional[str]:
+    if 'id' in params:
+        return params['id']
+    parts = [p for p in path.split('/') if p]
+    # /file/d/<id>/view
+    if 'd' in parts and parts.index('d') + 1 < len(parts):
+        return parts[parts.index('d') + 1]
+    return None
+
+def _drive_image_path(path: str) -> bool:
+    """Whether a Drive path serves file bytes rather than an HTML viewer page"""
+    return path.rstrip('/').rsplit('/', 1)[-1] in ('uc', 'thumbnail')
+
+def fetch_url(url: str) -> str:
+    """The URL to download for url: Drive viewer links (/file/d/<id>/view, /open?id=)
+    return an HTML page, so they are rewritten to the direct image URL their key stands for"""
+    parts = urlsplit(url.strip())
+    if parts.netloc.lower() in DRIVE_HOSTS and not _drive_image_path(parts.path):
+        file_id = _drive_file_id(parts.path, dict(parse_qsl(parts.query)))
+        if file_id:
+            return f"https://drive.google.com/uc?{urlencode({'export': 'view', 'id': file_id})}"
+    return url
+
+def canonical_image_key(url: str) -> str:
+    """Map an upstream image URL to a stable object identity"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    params = parse_qsl(parts.query, keep_blank_values=True)
+
+    if _is_gcs(host):
+        kept = sorted((k, v) for k, v in params if not _is_signature_param(k))
+        key = f"gcs:{host}{unquote(parts.path)}"
+        return f"{key}?{urlencode(kept)}" if kept else key
+
+    if host in DRIVE_HOSTS:
+        file_id = _drive_file_id(parts.path, dict(params))
+        if file_id:
+            # Thumbnails are different bytes from the original, keep the size in the key
+            size = dict(params).get('sz') if parts.path.rstrip('/').endswith('thumbnail') else None
+            # Viewer links share the key of the uc URL, which is what fetch_url downloads for them
+            return f"drive:{file_id}:{size}" if size else f"drive:{file_id}"
+
+    query = urlencode(sorted(params))
+    return urlunsplit((parts.scheme.lower(), host, parts.path, query, ''))
+
+def signature_expiry(url: str) -> Optional[float]:
+    """Unix time at which a signed URL stops working, or None if it is unsigned"""
+    params = {k.lower(): v for k, v in parse_qsl(urlsplit(url).query)}
+    try:
+        if 'expires' in params:
+            # V2 signing: absolute epoch seconds
+            return float(params['expires'])
+        if 'x-goog-date' in params and 'x-goog-expires' in params:
+            # V4 signing: start time plus a lifetime in seconds
+            start = datetime.strptime(params['x-goog-date'], '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+            return start.timestamp() + float(params['x-goog-expires'])
+    except ValueError:
+        return None
+    return None
+
+def unsigned_url(url: str) -> str:
+    """Strip signature parameters, for objects that are also publicly readable"""
+    parts = urlsplit(url)
+    kept = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _is_signature_param(k)]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(kept), ''))
+
+class SignedUrlRegistry:
+    """Remembers the longest-lived signed URL seen for each object identity"""
+
+    def __init__(self):
+        self.max_entries = int(os.environ.get('IMAGE_SIGNED_URL_ENTRIES', 20000))
+        self._urls: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def remember(self, key: str, url: str):
+        expiry = signature_expiry(url)
+        if expiry is None:
+            return
+        current = self._urls.get(key)
+        if current is None or expiry > current[0]:
+            self._urls[key] = (expiry, url)
+        self._urls.move_to_end(key)
+        while len(self._urls) > self.max_entries:
+            self._urls.popitem(last=False)
+
+    def candidates(self, key: str, url: str) -> List[str]:
+        """URLs to try for key, best first: freshest signed URL, then an unsigned fallback once expired"""
+        self.remember(key, url)
+        best = self._urls.get(key)
+        if best is None:
+            return [url]
+        expiry, freshest = best
+        urls = [freshest]
+        if expiry <= time.time():
+            urls.append(unsigned_url(freshest))
+        return urls
+
+    def __len__(self) -> int:
+        return len(self._urls)
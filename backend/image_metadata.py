@@ -0,0 +1,185 @@
+"""
+Precomputed metadata for gallery and review images: pixel dimensions,
+orientation, dominant colour, a blurhash and a tiny LQIP data URI.
+
+The index is produced offline by build_image_metadata.py and served from
+memory here, so the frontend can reserve layout space and show placeholders
+before an image downloads.
+"""
+import asyncio
+import base64
+import io
+import json
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional
+import logging
+
+from PIL import Image, ImageOps
+
+# Registers the HEIF opener when pillow-heif is installed
+import image_transform  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+IMAGE_METADATA_PATH = os.environ.get('IMAGE_METADATA_PATH', '/app/image_metadata.json')
+
+# Fields clients get; bookkeeping like content_hash stays server-side
+PUBLIC_FIELDS = ('width', 'height', 'orientation', 'dominant_color', 'blurhash', 'lqip')
+
+# Blurhash encoding (https://github.com/woltapp/blurhash)
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+def _encode83(value: int, length: int) -> str:
+    return ''.join(_BASE83[(value // (83 ** (length - i - 1))) % 83] for i in range(length))
+
+def _srgb_to_linear(value: int) -> float:
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+def _linear_to_srgb(value: float) -> int:
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+def _sign_pow(value: float, exp: float) -> float:
+    return math.copysign(abs(value) ** exp, value)
+
+def blurhash_encode(image: Image.Image, x_components: int = 4, y_components: int = 3) -> str:
+    """Blurhash of an RGB image; callers should downscale first (32px is plenty)"""
+    width, height = image.size
+    linear = [tuple(_srgb_to_linear(c) for c in pixel) for pixel in image.getdata()]
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            norm = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                cy = cos_y[j][y]
+                for x in range(width):
+                    basis = cos_x[i][x] * cy
+                    pr, pg, pb = linear[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = norm / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        actual_max = max(abs(v) for factor in ac for v in factor)
+        quantised_max = max(0, min(82, int(actual_max * 166 - 0.5)))
+        max_value = (quantised_max + 1) / 166
+        result += _encode83(quantised_max, 1)
+    else:
+        max_value = 1
+        result += _encode83(0, 1)
+    result += _encode83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (max(0, min(18, int(_sign_pow(v / max_value, 0.5) * 9 + 9.5))) for v in factor)
+        result += _encode83(r * 19 * 19 + g * 19 + b, 2)
+    return result
+
+def analyze_image(content: bytes) -> Dict[str, Any]:
+    """Decode an image once and extract its metadata. Runs in a worker process."""
+    with Image.open(io.BytesIO(content)) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    width, height = image.size
+    if width == height:
+        orientation = 'square'
+    else:
+        orientation = 'landscape' if width > height else 'portrait'
+
+    small = image.copy()
+    small.thumbnail((32, 32))
+
+    # Most common colour of a reduced palette is a better placeholder than the mean
+    palette = small.quantize(colors=5)
+    counts = sorted(palette.getcolors(), reverse=True)
+    colors = palette.getpalette()
+    index = counts[0][1]
+    dominant = '#{:02x}{:02x}{:02x}'.format(*colors[index * 3:index * 3 + 3])
+
+    lqip_image = image.copy()
+    lqip_image.thumbnail((16, 16))
+    buffer = io.BytesIO()
+    lqip_image.save(buffer, 'JPEG', quality=40)
+
+    return {
+        'width': width,
+        'height': height,
+        'orientation': orientation,
+        'dominant_color': dominant,
+        'blurhash': blurhash_encode(small),
+        'lqip': 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii'),
+        'bytes': len(content),
+    }
+
+def public_metadata(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: entry[field] for field in PUBLIC_FIELDS if field in entry}
+
+class ImageMetadataIndex:
+    """Read side of the metadata index, reloaded when the file changes"""
+
+    def __init__(self, path: str = IMAGE_METADATA_PATH):
+        self.path = path
+        self.check_interval = float(os.environ.get('IMAGE_METADATA_CHECK_INTERVAL', 30.0))
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._mtime_ns: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        with open(self.path, 'r') as f:
+            entries = json.load(f).get('images', {})
+        return {key: public_metadata(entry) for key, entry in entries.items()}
+
+    async def refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        async with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            try:
+                mtime_ns = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                return
+            if mtime_ns == self._mtime_ns:
+                return
+            try:
+                self.entries = await asyncio.to_thread(self._load)
+                self._mtime_ns = mtime_ns
+                logger.info(f"Loaded image metadata for {len(self.entries)} images")
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to load image metadata from {self.path}: {e}")
+
+    @property
+    def version(self) -> Optional[int]:
+        """mtime of the loaded index file, None until one is loaded"""
+        return self._mtime_ns
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(key)
+
+    def annotate(self, photos: List[Dict[str, Any]], key_for) -> List[Dict[str, Any]]:
+        """Copies of photos with a 'metadata' field where the index has one;
+        key_for returns None for photos that should be left alone"""
+        entries = self.entries
+        annotated = []
+        for photo in photos:
+            key = key_for(photo)
+            meta = entries.get(key) if key is not None else None
+            annotated.append({**photo, 'metadata': meta} if meta else photo)
+        return annotated
+
+# Global metadata index instance
+image_metadata_index = ImageMetadataIndex()
@@ -0,0 +1,199 @@
+"""
+Background prewarmer for the image proxy cache.
+
+The full image universe is known up front (review photos in MongoDB plus the
+Drive gallery dataset), so after a deploy or restart we walk it with bounded
+concurrency and a start-rate limit, filling the cache with the common thumbnail
+sizes before visitors ask for them.
+
+Originals are large and the gallery alone is several times the disk tier, so by
+default they are only fetched to render derivatives and dropped again afterwards
+(IMAGE_PREWARM_ORIGINALS opts in to keeping them), and a run stops once what it
+has stored reaches IMAGE_PREWARM_DISK_FRACTION of the disk tier so it never
+evicts its own work.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import logging
+
+from fastapi import APIRouter
+
+from gallery import gallery_store, is_image_photo
+from image_cache import image_cache
+from image_keys import canonical_image_key
+from image_proxy import warm_image
+from image_transform import TransformSpec, is_heif
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+def _parse_widths(value: str) -> List[int]:
+    return [int(w) for w in value.split(',') if w.strip().isdigit()]
+
+class ImagePrewarmer:
+    def __init__(self):
+        self.concurrency = int(os.environ.get('IMAGE_PREWARM_CONCURRENCY', 4))
+        # Maximum new fetches started per second, so live traffic keeps most of the pool
+        self.rate_per_second = float(os.environ.get('IMAGE_PREWARM_RATE', 5))
+        self.widths = _parse_widths(os.environ.get('IMAGE_PREWARM_WIDTHS', '400,800'))
+        self.thumbnail_format = os.environ.get('IMAGE_PREWARM_FORMAT', 'webp')
+        self.interval = float(os.environ.get('IMAGE_PREWARM_INTERVAL', 0))
+        self.on_startup = os.environ.get('IMAGE_PREWARM_ON_STARTUP', 'true').lower() in ('1', 'true', 'yes')
+        self.warm_originals = os.environ.get('IMAGE_PREWARM_ORIGINALS', 'false').lower() in ('1', 'true', 'yes')
+        self.disk_fraction = float(os.environ.get('IMAGE_PREWARM_DISK_FRACTION', 0.5))
+
+        self.database = None
+        # Gallery URLs whose mime_type says HEIF, though the URL itself has no extension
+        self._heif_urls = set()
+        self._task: Optional[asyncio.Task] = None
+        self._next_slot = 0.0
+        self._rate_lock = asyncio.Lock()
+        self.progress: Dict[str, Any] = {'status': 'idle', 'runs': 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # Sources
+    async def collect_urls(self) -> List[str]:
+        urls = []
+        heif_urls = set()
+        if self.database is not None:
+            urls.extend(await self.database.get_review_image_urls())
+        snapshot = await gallery_store.get_snapshot()
+        if snapshot is not None:
+            for album in snapshot.data.values():
+                # Videos would be downloaded in full just to fail every thumbnail transform
+                for photo in album.get('photos', []):
+                    if photo.get('url') and is_image_photo(photo):
+                        urls.append(photo['url'])
+                        if is_heif(photo['url'], photo.get('mime_type')):
+                            heif_urls.add(photo['url'])
+        self._heif_urls = heif_urls
+        # Keep order stable while dropping duplicates
+        return list(dict.fromkeys(urls))
+
+    def _specs_for(self, url: str) -> List[Optional[TransformSpec]]:
+        specs: List[Optional[TransformSpec]] = [None] if self.warm_originals else []
+        if is_heif(url) or url in self._heif_urls:
+            # What /api/proxy-image serves for a bare HEIC request
+            specs.append(TransformSpec())
+        specs.extend(TransformSpec(width=w, format=self.thumbnail_format) for w in self.widths)
+        return specs
+
+    # Worker
+    async def _throttle(self):
+        if self.rate_per_second <= 0:
+            return
+        async with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + 1.0 / self.rate_per_second
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _budget_spent(self) -> bool:
+        return self.progress['bytes'] >= self.progress['budget_bytes']
+
+    async def _warm(self, url: str, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            if self._budget_spent():
+                return
+            key = canonical_image_key(url)
+            had_original = await image_cache.contains(key)
+            for spec in self._specs_for(url):
+                if self._budget_spent():
+                    break
+                await self._throttle()
+                try:
+                    if await warm_image(url, spec):
+                        self.progress['fetched'] += 1
+                        stored = await image_cache.size_of(key if spec is None else f"{key}#{spec.key}")
+                        self.progress['bytes'] += stored or 0
+                    else:
+                        self.progress['skipped'] += 1
+                except Exception as e:
+                    # A broken original makes its derivatives pointless too
+                    self.progress['failed'] += 1
+                    logger.warning(f"Prewarm failed for {url}: {getattr(e, 'detail', e)}")
+                    break
+            if not self.warm_originals and not had_original:
+                # Rendering the derivatives cached the original; it is not ours to keep
+                await image_cache.discard(key)
+            self.progress['done'] += 1
+
+    async def run_once(self):
+        self.progress = {
+            'status': 'running',
+            'runs': self.progress.get('runs', 0) + 1,
+            'total': 0,
+            'done': 0,
+            'fetched': 0,
+            'skipped': 0,
+            'failed': 0,
+            'bytes': 0,
+            'budget_bytes': int(image_cache.disk_max_bytes * self.disk_fraction),
+            'started_at': datetime.utcnow().isoformat(),
+            'finished_at': None,
+        }
+        try:
+            urls = await self.collect_urls()
+            self.progress['total'] = len(urls)
+            logger.info(f"Prewarming image cache for {len(urls)} images")
+            semaphore = asyncio.Semaphore(self.concurrency)
+            await asyncio.gather(*(self._warm(url, semaphore) for url in urls))
+            self.progress['status'] = 'budget_reached' if self._budget_spent() else 'completed'
+            logger.info(f"Image prewarm {self.progress['status']}: {self.progress['fetched']} fetched "
+                        f"({self.progress['bytes']} bytes), {self.progress['skipped']} already cached, "
+                        f"{self.progress['failed']} failed")
+        except asyncio.CancelledError:
+            self.progress['status'] = 'cancelled'
+            raise
+        except Exception as e:
+            self.progress['status'] = 'failed'
+            self.progress['error'] = str(e)
+            logger.error(f"Image prewarm failed: {e}")
+        finally:
+            self.progress['finished_at'] = datetime.utcnow().isoformat()
+
+    async def _loop(self):
+        while True:
+            await self.run_once()
+            if self.interval <= 0:
+                return
+            await asyncio.sleep(self.interval)
+
+    # Lifecycle
+    def start(self, database=None) -> bool:
+        """Start a prewarm run in the background. Returns False if one is already running."""
+        if database is not None:
+            self.database = database
+        if self.running:
+            return False
+        self._task = asyncio.create_task(self._loop())
+        return True
+
+    async def stop(self):
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+# Global prewarmer instance
+image_prewarmer = ImagePrewarmer()
+
+@router.get("/api/proxy-image/prewarm")
+async def prewarm_status():
+    """Progress of the current or last prewarm run"""
+    return image_prewarmer.progress
+
+@router.post("/api/proxy-image/prewarm")
+async def start_prewarm():
+    """Start a prewarm run if one is not already in progress (admin endpoint)"""
+    started = image_prewarmer.start()
+    return {"started": started, "progress": image_prewarmer.progress}
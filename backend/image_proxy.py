@@ -1,37 +1,405 @@
 """
 Image proxy to handle Checkatrade's Google Storage URLs
 """
+import asyncio
+import os
 import httpx
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from email.utils import parsedate_to_datetime
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
 import logging
 
+from PIL import UnidentifiedImageError
+
+from image_cache import CachedImage, image_cache
+from http_headers import etag_matches
+from image_flight import Flight, FlightGroup
+from image_keys import SignedUrlRegistry, canonical_image_key, fetch_url
+from image_transform import HEIF_SNIFF_BYTES, TransformSpec, is_heif, transform_image
+from upstream_guard import CircuitOpenError, upstream_guard
+
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.get("/api/proxy-image")
-async def proxy_image(url: str):
+UPSTREAM_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
+    'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Referer': 'https://www.checkatrade.com/',
+}
+
+# Pool tuning - one client is shared for the lifetime of the app
+MAX_CONNECTIONS = int(os.environ.get('IMAGE_PROXY_MAX_CONNECTIONS', 100))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('IMAGE_PROXY_MAX_KEEPALIVE', 20))
+KEEPALIVE_EXPIRY = float(os.environ.get('IMAGE_PROXY_KEEPALIVE_EXPIRY', 30.0))
+STREAM_CHUNK_SIZE = int(os.environ.get('IMAGE_PROXY_CHUNK_SIZE', 64 * 1024))
+
+# Timeout budget: per-phase limits plus an overall cap on one upstream download,
+# including time spent queueing for the per-host concurrency limit
+CONNECT_TIMEOUT = float(os.environ.get('IMAGE_PROXY_CONNECT_TIMEOUT', 5.0))
+READ_TIMEOUT = float(os.environ.get('IMAGE_PROXY_READ_TIMEOUT', 15.0))
+POOL_TIMEOUT = float(os.environ.get('IMAGE_PROXY_POOL_TIMEOUT', 5.0))
+TOTAL_TIMEOUT = float(os.environ.get('IMAGE_PROXY_TOTAL_TIMEOUT', 45.0))
+
+# Browser/CDN caching: a proxy URL keeps its meaning when the upstream image is
+# replaced, so responses revalidate against their strong ETag unless the request
+# pins a content version (v=<digest>) that matches what is being served
+ORIGINAL_CACHE_CONTROL = os.environ.get(
+    'IMAGE_PROXY_CACHE_CONTROL', 'public, max-age=86400, stale-while-revalidate=604800'
+)
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_client: Optional[httpx.AsyncClient] = None
+
+# Concurrent requests for the same object share one upstream download
+flights = FlightGroup()
+
+# Freshest signed URL per object, used to refetch after a signature expires
+signed_urls = SignedUrlRegistry()
+
+# Statuses that mean "this signature is no good", worth retrying with another URL
+SIGNATURE_REJECTED = (400, 401, 403)
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared upstream client, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                connect=CONNECT_TIMEOUT,
+                read=READ_TIMEOUT,
+                write=READ_TIMEOUT,
+                pool=POOL_TIMEOUT,
+            ),
+            follow_redirects=True,
+            headers=UPSTREAM_HEADERS,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+        )
+        logger.info(f"Image proxy client created (max_connections={MAX_CONNECTIONS}, keepalive={MAX_KEEPALIVE_CONNECTIONS})")
+    return _client
+
+async def close_client():
+    """Close the shared upstream client on shutdown"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def _not_modified(request: Request, image: CachedImage) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        return etag_matches(if_none_match, image.strong_etag)
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(image.last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single 'bytes=' range into inclusive (start, end).
+
+    Returns None when the header should be ignored and raises ValueError when the
+    range cannot be satisfied.
     """
-    Proxy images from external sources to bypass CORS and authentication issues
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        # Multipart ranges are rare for images; serving the full body is allowed
+        return None
+    first, _, last = spec.strip().partition('-')
+    if (first and not first.isdigit()) or (last and not last.isdigit()) or not (first or last):
+        return None
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start > end and start < size:
+            # Syntactically invalid range, ignore it
+            return None
+    else:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+        if int(last) == 0:
+            raise ValueError("Empty suffix range")
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+def _pins_version(version: Optional[str], digest: Optional[str]) -> bool:
+    """Whether a v= parameter names this content (our digest, or the full sha256 it prefixes)"""
+    return bool(version and digest) and version.strip('"')[:len(digest)] == digest
+
+def _cached_response(request: Request, image: CachedImage, immutable: bool = False) -> Response:
+    """Serve a cached image, honouring conditional and Range requests"""
+    headers = {
+        'ETag': image.strong_etag,
+        'Last-Modified': image.last_modified,
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else ORIGINAL_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+    if _not_modified(request, image):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and (if_range is None or etag_matches(if_range, image.strong_etag)):
+        try:
+            byte_range = _parse_range(range_header, image.size)
+        except ValueError:
+            headers['Content-Range'] = f"bytes */{image.size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            headers['Content-Range'] = f"bytes {start}-{end}/{image.size}"
+            return Response(
+                content=image.content[start:end + 1],
+                status_code=206,
+                media_type=image.content_type,
+                headers=headers
+            )
+
+    return Response(content=image.content, media_type=image.content_type, headers=headers)
+
+async def _fetch_url_into(flight: Flight, url: str, last_attempt: bool) -> bool:
+    """Download one URL into a flight under its host's concurrency cap and breaker.
+
+    Returns False when upstream rejected the URL and the next candidate should be tried.
     """
+    upstream = upstream_guard.host(urlsplit(url).hostname or '')
+    upstream.check()
     try:
-        async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
-            response = await client.get(url, headers={
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-                'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Referer': 'https://www.checkatrade.com/',
-            })
-            
-            if response.status_code == 200:
-                return StreamingResponse(
-                    iter([response.content]),
-                    media_type=response.headers.get('content-type', 'image/jpeg')
-                )
+        await upstream.acquire()
+    except BaseException:
+        # Cancelled while queued for a slot; the host was never contacted
+        upstream.abandon()
+        raise
+    try:
+        async with get_client().stream("GET", url) as response:
+            if response.status_code >= 500 or response.status_code == 429:
+                upstream.record_failure()
             else:
-                logger.error(f"Failed to fetch image: {response.status_code}")
-                raise HTTPException(status_code=404, detail="Image not found")
-                
+                upstream.record_success()
+            if response.status_code in SIGNATURE_REJECTED and not last_attempt:
+                logger.info(f"Upstream rejected {flight.key} ({response.status_code}), retrying with refreshed URL")
+                return False
+            flight.start(response.status_code, response.headers)
+            if response.status_code != 200:
+                return True
+            cacheable = True
+            async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                await flight.feed(chunk)
+                if cacheable and flight.size > image_cache.max_entry_bytes:
+                    cacheable = False
+                    flights.detach(flight)
+    except BaseException as e:
+        # Cancellation here means the total budget ran out
+        upstream.record_failure(timeout=isinstance(e, (httpx.TimeoutException, asyncio.CancelledError)))
+        raise
+    finally:
+        upstream.release()
+
+    if cacheable:
+        await image_cache.put(flight.key, CachedImage(
+            flight.content,
+            content_type=response.headers.get('content-type', 'image/jpeg'),
+            etag=response.headers.get('etag'),
+            last_modified=response.headers.get('last-modified'),
+        ))
+    return True
+
+async def _fetch_into(flight: Flight, urls: List[str]):
+    """Download the first working URL into a shared flight, filling the cache once it completes"""
+    async with asyncio.timeout(TOTAL_TIMEOUT):
+        for attempt, url in enumerate(urls):
+            if await _fetch_url_into(flight, url, last_attempt=attempt == len(urls) - 1):
+                return
+
+async def _wait_for_upstream(flight: Flight):
+    """Wait for a flight's response headers, mapping failures to HTTP errors.
+
+    On failure the caller's claim on the flight is released, as it will never read it.
+    """
+    try:
+        await _check_upstream(flight)
+    except BaseException:
+        flight.release()
+        raise
+
+async def _check_upstream(flight: Flight):
+    try:
+        await flight.wait_started()
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={'Retry-After': str(max(1, int(e.retry_after)))}
+        )
+    except (TimeoutError, httpx.TimeoutException) as e:
+        logger.error(f"Timed out proxying image {flight.key}: {e!r}")
+        raise HTTPException(status_code=504, detail="Timed out fetching image")
     except Exception as e:
         logger.error(f"Error proxying image: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch image: {str(e)}")
+
+    if flight.status_code != 200:
+        logger.error(f"Failed to fetch image: {flight.status_code}")
+        raise HTTPException(status_code=404, detail="Image not found")
+
+def _join_original(key: str, url: str) -> Flight:
+    urls = signed_urls.candidates(key, fetch_url(url))
+    flight, _ = flights.join(key, lambda f: _fetch_into(f, urls))
+    return flight
+
+async def _load_original(key: str, url: str) -> CachedImage:
+    """Return the full original image, from cache or a (shared) upstream download"""
+    cached = await image_cache.get(key)
+    if cached is not None:
+        return cached
+
+    flight = _join_original(key, url)
+    await _wait_for_upstream(flight)
+    content = await flight.result()
+    return CachedImage(
+        content,
+        content_type=flight.headers.get('content-type', 'image/jpeg'),
+        etag=flight.headers.get('etag'),
+        last_modified=flight.headers.get('last-modified'),
+    )
+
+async def _render_into(flight: Flight, key: str, url: str, spec: TransformSpec):
+    """Produce a derivative of an original into a shared flight and cache it"""
+    source = await _load_original(key, url)
+    try:
+        content, content_type = await transform_image(source.content, spec)
+    except (UnidentifiedImageError, OSError) as e:
+        logger.error(f"Failed to transform image {url}: {e}")
+        raise HTTPException(status_code=415, detail="Unsupported image format")
+
+    derivative = CachedImage(content, content_type=content_type, source_digest=source.digest)
+    await image_cache.put(flight.key, derivative)
+    flight.start(200, {
+        'content-type': content_type,
+        'last-modified': derivative.last_modified,
+        'x-source-digest': source.digest,
+    })
+    await flight.feed(content)
+
+async def warm_image(url: str, spec: Optional[TransformSpec] = None) -> bool:
+    """Make sure an original (or a derivative of it) is cached.
+
+    Returns True if it had to be fetched or rendered, False if it was already cached.
+    """
+    key = canonical_image_key(url)
+    signed_urls.remember(key, url)
+    if spec is None:
+        if await image_cache.contains(key):
+            return False
+        flight = _join_original(key, url)
+    else:
+        derivative_key = f"{key}#{spec.key}"
+        if await image_cache.contains(derivative_key):
+            return False
+        flight, _ = flights.join(derivative_key, lambda f: _render_into(f, key, url, spec))
+    await _wait_for_upstream(flight)
+    await flight.wait_finished()
+    return True
+
+@router.get("/api/proxy-image")
+async def proxy_image(
+    request: Request,
+    url: str,
+    width: Optional[int] = Query(None, ge=1),
+    height: Optional[int] = Query(None, ge=1),
+    quality: Optional[int] = Query(None, ge=1, le=95),
+    format: Optional[str] = Query(None, description="Output format: webp or jpeg"),
+    v: Optional[str] = Query(None, description="Content version: digest of the original image"),
+):
+    """
+    Proxy images from external sources to bypass CORS and authentication issues.
+    Hits are served from the image cache. Misses join a single shared upstream download
+    per URL and stream its chunks as they arrive, while the download fills the cache.
+
+    With width/height/quality/format a resized derivative is returned instead; HEIC
+    sources are always converted so browsers can display them, whether they are
+    recognised by URL suffix, upstream Content-Type or their leading bytes.
+
+    Everything is keyed by the canonical object identity rather than the raw URL, so
+    rotated Google Storage signatures keep hitting the same cache entries.
+
+    Cached entries are served regardless of upstream health; when an origin's circuit
+    breaker is open, misses fail fast with 503 instead of queueing behind it.
+
+    Cached responses carry a strong content ETag and support If-None-Match,
+    If-Modified-Since and single byte Range requests. The URL alone does not change
+    when an upstream image is replaced, so responses must revalidate; only a request
+    whose v= matches the digest of the original (e.g. the metadata content_hash) is
+    marked immutable.
+    """
+    try:
+        if any(value is not None for value in (width, height, quality, format)) or is_heif(url):
+            spec = TransformSpec(width, height, quality, format)
+        else:
+            spec = None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    key = canonical_image_key(url)
+    signed_urls.remember(key, url)
+    if spec is None:
+        cached = await image_cache.get(key)
+        if cached is not None:
+            if not is_heif(url, cached.content_type, cached.content[:HEIF_SNIFF_BYTES]):
+                return _cached_response(request, cached, immutable=_pins_version(v, cached.digest))
+            spec = TransformSpec()
+        else:
+            flight = _join_original(key, url)
+            await _wait_for_upstream(flight)
+            if not is_heif(url, flight.headers.get('content-type'), await flight.peek(HEIF_SNIFF_BYTES)):
+                # The content hash is not known until the download completes, so the first
+                # response only carries upstream's Last-Modified; later hits get a strong ETag
+                headers = {'Cache-Control': ORIGINAL_CACHE_CONTROL}
+                if 'last-modified' in flight.headers:
+                    headers['Last-Modified'] = flight.headers['last-modified']
+                return StreamingResponse(
+                    flight.iter_chunks(),
+                    media_type=flight.headers.get('content-type', 'image/jpeg'),
+                    headers=headers
+                )
+            # HEIF behind an extension-less URL: convert it like a .heic request
+            flight.release()
+            spec = TransformSpec()
+
+    derivative_key = f"{key}#{spec.key}"
+    cached = await image_cache.get(derivative_key)
+    if cached is not None:
+        return _cached_response(request, cached, immutable=_pins_version(v, cached.source_digest))
+
+    flight, _ = flights.join(derivative_key, lambda f: _render_into(f, key, url, spec))
+    await _wait_for_upstream(flight)
+    content = await flight.result()
+    derivative = CachedImage(
+        content,
+        content_type=spec.content_type,
+        last_modified=flight.headers.get('last-modified'),
+        source_digest=flight.headers.get('x-source-digest'),
+    )
+    return _cached_response(request, derivative, immutable=_pins_version(v, derivative.source_digest))
+
+@router.get("/api/proxy-image/stats")
+async def proxy_image_stats():
+    """Image cache hit/miss counters, in-flight downloads and per-host breaker state"""
+    return {
+        "cache": image_cache.get_stats(),
+        "flights": flights.get_stats(),
+        "signed_urls": len(signed_urls),
+        "upstreams": upstream_guard.get_stats(),
+    }
@@ -0,0 +1,112 @@
+"""
+Server-side resizing and format transcoding for proxied images.
+
+Decoding and encoding are CPU bound, so they run in a process pool rather than
+on the event loop.
+"""
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+import logging
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+    HEIF_SUPPORTED = True
+except ImportError:
+    HEIF_SUPPORTED = False
+
+OUTPUT_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+HEIF_CONTENT_TYPES = ('image/heic', 'image/heif', 'image/heic-sequence', 'image/heif-sequence')
+# Major brands in the ftyp box of HEIC/HEIF files
+HEIF_BRANDS = (b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx', b'mif1', b'msf1')
+HEIF_SNIFF_BYTES = 12
+
+MAX_DIMENSION = int(os.environ.get('IMAGE_TRANSFORM_MAX_DIMENSION', 2048))
+DEFAULT_QUALITY = int(os.environ.get('IMAGE_TRANSFORM_DEFAULT_QUALITY', 80))
+TRANSFORM_WORKERS = int(os.environ.get('IMAGE_TRANSFORM_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+
+class TransformSpec:
+    """Requested derivative of a source image"""
+
+    def __init__(self, width: Optional[int] = None, height: Optional[int] = None,
+                 quality: Optional[int] = None, format: Optional[str] = None):
+        self.width = min(width, MAX_DIMENSION) if width else None
+        self.height = min(height, MAX_DIMENSION) if height else None
+        self.quality = quality or DEFAULT_QUALITY
+        self.format = (format or 'jpeg').lower()
+        if self.format == 'jpg':
+            self.format = 'jpeg'
+        if self.format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported format '{format}', expected one of {', '.join(OUTPUT_FORMATS)}")
+
+    @property
+    def key(self) -> str:
+        """Stable cache key suffix for this transform"""
+        return f"w={self.width or ''};h={self.height or ''};q={self.quality};f={self.format}"
+
+    @property
+    def content_type(self) -> str:
+        return OUTPUT_FORMATS[self.format][1]
+
+def is_heif(url: str, content_type: Optional[str] = None, head: Optional[bytes] = None) -> bool:
+    """Whether an image is HEIF, judged by its content type, leading bytes or URL suffix.
+
+    Drive serves HEIC photos from extension-less uc?id= URLs, so callers that have the
+    response should pass its content type and first bytes.
+    """
+    if content_type and content_type.split(';')[0].strip().lower() in HEIF_CONTENT_TYPES:
+        return True
+    if head and len(head) >= HEIF_SNIFF_BYTES and head[4:8] == b'ftyp' and head[8:12] in HEIF_BRANDS:
+        return True
+    path = url.split('?', 1)[0].lower()
+    return path.endswith('.heic') or path.endswith('.heif')
+
+def render(content: bytes, width: Optional[int], height: Optional[int],
+           quality: int, format: str) -> bytes:
+    """Decode, orient, downscale and re-encode an image. Runs in a worker process."""
+    pil_format = OUTPUT_FORMATS[format][0]
+    with Image.open(io.BytesIO(content)) as image:
+        image = ImageOps.exif_transpose(image)
+        if width or height:
+            # Fit inside the requested box, keeping aspect ratio and never upscaling
+            image.thumbnail((width or image.width, height or image.height), Image.LANCZOS)
+        if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        output = io.BytesIO()
+        image.save(output, pil_format, quality=quality, optimize=pil_format == 'JPEG')
+        return output.getvalue()
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=TRANSFORM_WORKERS)
+        logger.info(f"Image transform pool started with {TRANSFORM_WORKERS} workers")
+    return _executor
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def transform_image(content: bytes, spec: TransformSpec) -> Tuple[bytes, str]:
+    """Render a derivative in the process pool, returning (bytes, content_type)"""
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(
+        get_executor(), render, content, spec.width, spec.height, spec.quality, spec.format
+    )
+    return result, spec.content_type
@@ -4,11 +4,9 @@ Load real scraped Checkatrade reviews into MongoDB with geocoding
 import asyncio
 import json
 import logging
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
 from dotenv import load_dotenv
 from pathlib import Path
-import uuid
+from database import Database
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -36,9 +34,8 @@ async def load_real_checkatrade_reviews():
     load_dotenv(ROOT_DIR / '.env')
     
     # Connect to MongoDB
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[os.environ['DB_NAME']]
+    database = Database()
+    database.connect()
     
     try:
         # Load scraped reviews
@@ -57,7 +54,6 @@ async def load_real_checkatrade_reviews():
             
             # Create review document
             review_doc = {
-                'id': str(uuid.uuid4()),
                 'name': review.get('customer_name', 'Anonymous'),
                 'rating': review.get('rating', 10),
                 'date': review.get('date', 'Recently'),
@@ -74,18 +70,15 @@ async def load_real_checkatrade_reviews():
             mongo_reviews.append(review_doc)
             logger.info(f"Prepared review: {review_doc['service'][:50]} - {postcode} ({lat}, {lng})")
         
-        # Clear existing reviews
-        delete_result = await db.reviews.delete_many({})
-        logger.info(f"Deleted {delete_result.deleted_count} existing reviews")
-        
-        # Insert new reviews
-        if mongo_reviews:
-            result = await db.reviews.insert_many(mongo_reviews)
-            logger.info(f"✅ Inserted {len(result.inserted_ids)} real Checkatrade reviews")
+        # Apply only what changed since the last import; running API workers
+        # drop their cached reviews on their next version check
+        report = await database.ingest_reviews(mongo_reviews, source="checkatrade")
+        logger.info(f"✅ Ingested real Checkatrade reviews: {report}")
         
         # Print summary
         print("\n📊 Review Import Summary:")
-        print(f"Total reviews imported: {len(mongo_reviews)}")
+        print(f"Total reviews imported: {len(mongo_reviews)} "
+              f"({report['inserted']} new, {report['updated']} updated, {report['deleted']} removed, {report['unchanged']} unchanged)")
         print(f"Reviews with images: {sum(1 for r in mongo_reviews if r.get('images'))}")
         print(f"Average rating: {sum(r['rating'] for r in mongo_reviews) / len(mongo_reviews):.1f}/10")
         print(f"\nPostcodes covered:")
@@ -99,7 +92,7 @@ async def load_real_checkatrade_reviews():
         logger.error(f"Error loading reviews: {e}")
         raise
     finally:
-        client.close()
+        await database.close()
 
 if __name__ == "__main__":
     asyncio.run(load_real_checkatrade_reviews())
@@ -0,0 +1,311 @@
+"""
+In-memory storage backend (STORAGE_BACKEND=memory).
+
+Same semantics as database.Database (newest-first keyset pages with the same
+cursors, approved-only review reads, unique ids, API projections, query cache)
+with the collections held in process. Nothing is persisted; set
+MEMORY_STORAGE_FIXTURES to a JSON file of {"collection": [documents]} to start
+with data, e.g. a reviews export.
+"""
+import bisect
+import json
+import math
+import os
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from models import Service, Review, QuoteRequest, Contact, GalleryImage
+from query_cache import QueryCache
+from review_ingest import INGEST_PROJECTION, plan_ingest
+from review_map import marker, with_location
+from review_search import SEARCH_PROJECTION
+from seed_data import SEED_GALLERY, SEED_SERVICES
+from storage import PROJECTIONS, Page, Storage, decode_page_cursor, encode_page_cursor, sort_key
+
+logger = logging.getLogger(__name__)
+
+COLLECTIONS = ("services", "reviews", "quote_requests", "contacts", "gallery")
+
+EARTH_RADIUS_M = 6378100
+
+def _project(doc: Dict[str, Any], projection: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply an inclusion projection; {"$slice": n} keeps the first n items of a list"""
+    out = {}
+    for field, spec in projection.items():
+        if field == "_id" or not spec or field not in doc:
+            continue
+        value = doc[field]
+        if isinstance(spec, dict) and "$slice" in spec and isinstance(value, list):
+            value = value[:spec["$slice"]]
+        out[field] = list(value) if isinstance(value, list) else value
+    return out
+
+def _coordinates(doc: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """(lat, lng) from a review's GeoJSON location"""
+    location = doc.get("location")
+    if not location:
+        return None
+    lng, lat = location["coordinates"]
+    return lat, lng
+
+def _distance_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+class Collection:
+    """Documents by id, plus the same documents kept in listing order"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        # Ascending sort keys and documents; listings walk them from the end
+        self._keys: List[Tuple] = []
+        self._ordered: List[Dict[str, Any]] = []
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def insert(self, doc: Dict[str, Any]):
+        if doc.get("id") in self.by_id:
+            raise ValueError(f"Duplicate id '{doc.get('id')}' in {self.name}")
+        doc = dict(doc)
+        key = sort_key(doc)
+        position = bisect.bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._ordered.insert(position, doc)
+        self.by_id[doc["id"]] = doc
+
+    def replace(self, doc: Dict[str, Any]):
+        self.delete(doc["id"])
+        self.insert(doc)
+
+    def delete(self, doc_id: str) -> bool:
+        doc = self.by_id.pop(doc_id, None)
+        if doc is None:
+            return False
+        position = bisect.bisect_left(self._keys, sort_key(doc))
+        while self._ordered[position] is not doc:
+            position += 1
+        del self._keys[position]
+        del self._ordered[position]
+        return True
+
+    def newest_first(self, cursor: Optional[str] = None):
+        """Documents in listing order, starting after cursor. Raises ValueError for a bad cursor."""
+        end = len(self._ordered)
+        if cursor:
+            created_at, last_id = decode_page_cursor(cursor)
+            end = bisect.bisect_left(self._keys, sort_key({"created_at": created_at, "id": last_id}))
+        for position in range(end - 1, -1, -1):
+            yield self._ordered[position]
+
+    def all(self):
+        return self._ordered
+
+class MemoryStorage(Storage):
+    def __init__(self):
+        self.collections = {name: Collection(name) for name in COLLECTIONS}
+        # Single process, so local invalidation is all the cache needs
+        self.cache = QueryCache()
+
+    def connect(self):
+        path = os.environ.get("MEMORY_STORAGE_FIXTURES")
+        if not path:
+            return
+        with open(path) as f:
+            fixtures = json.load(f)
+        for name, docs in fixtures.items():
+            for doc in docs:
+                self.collections[name].insert(with_location(doc) if name == "reviews" else doc)
+        logger.info(f"Loaded fixtures from {path}: " + ", ".join(f"{len(docs)} {name}" for name, docs in fixtures.items()))
+
+    async def _collection_changed(self, collection_name: str):
+        self.cache.invalidate(collection_name)
+
+    async def ensure_indexes(self) -> Dict[str, List[str]]:
+        # Ids are unique by construction and listings are kept sorted
+        return {"created": [], "existing": [], "failed": []}
+
+    async def seed_initial_data(self):
+        if len(self.collections["services"]):
+            logger.info("Storage already seeded, skipping...")
+            return
+        for service in SEED_SERVICES:
+            self.collections["services"].insert(service)
+        await self._collection_changed("services")
+        for image in SEED_GALLERY:
+            self.collections["gallery"].insert(image)
+        logger.info("Memory storage seeded with initial data")
+
+    async def backfill_review_locations(self) -> int:
+        reviews = self.collections["reviews"]
+        missing = [doc for doc in reviews.all() if "location" not in doc]
+        updated = [with_location(dict(doc)) for doc in missing]
+        updated = [doc for doc in updated if "location" in doc]
+        for doc in updated:
+            reviews.replace(doc)
+        if updated:
+            await self._collection_changed("reviews")
+        return len(updated)
+
+    def _page(self, name: str, limit: int, cursor: Optional[str], approved_only: bool = False) -> Page:
+        docs = []
+        for doc in self.collections[name].newest_first(cursor):
+            if approved_only and doc.get("approved") is not True:
+                continue
+            docs.append(doc)
+            if len(docs) > limit:
+                break
+        next_cursor = encode_page_cursor(docs[limit - 1]) if len(docs) > limit else None
+        return [_project(doc, PROJECTIONS[name]) for doc in docs[:limit]], next_cursor
+
+    def _approved_reviews(self):
+        return (doc for doc in self.collections["reviews"].all() if doc.get("approved") is True)
+
+    async def _insert(self, name: str, doc: Dict[str, Any]):
+        self.collections[name].insert(doc)
+        if name in ("services", "reviews"):
+            await self._collection_changed(name)
+
+    # Services
+    async def get_all_services(self) -> List[Dict[str, Any]]:
+        async def load():
+            return [_project(doc, PROJECTIONS["services"]) for doc in self.collections["services"].all()]
+        return await self.cache.get("services", "all", load)
+
+    async def get_service_by_id(self, service_id: str) -> Optional[Dict[str, Any]]:
+        async def load():
+            doc = self.collections["services"].by_id.get(service_id)
+            return _project(doc, PROJECTIONS["services"]) if doc else None
+        return await self.cache.get("services", ("id", service_id), load)
+
+    async def create_service(self, service: Service) -> str:
+        await self._insert("services", service.dict())
+        return service.id
+
+    # Reviews
+    async def get_reviews_page(self, limit: int, cursor: Optional[str] = None) -> Page:
+        if cursor:
+            decode_page_cursor(cursor)
+        async def load():
+            return self._page("reviews", limit, cursor, approved_only=True)
+        return await self.cache.get("reviews", (limit, cursor), load)
+
+    async def get_review_markers(self, bbox=None, near=None, max_distance: Optional[float] = None,
+                                 limit: int = 500) -> List[Dict[str, Any]]:
+        located = [(doc, _coordinates(doc)) for doc in self._approved_reviews()]
+        located = [(doc, point) for doc, point in located if point is not None]
+        if near is not None:
+            by_distance = sorted(((_distance_m(near[0], near[1], lat, lng), doc) for doc, (lat, lng) in located),
+                                 key=lambda item: item[0])
+            docs = [doc for distance, doc in by_distance if max_distance is None or distance <= max_distance]
+        elif bbox is not None:
+            min_lng, min_lat, max_lng, max_lat = bbox
+            docs = [doc for doc, (lat, lng) in located if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng]
+        else:
+            docs = [doc for doc, _ in located]
+        return [marker(doc) for doc in docs[:limit]]
+
+    async def get_review_points(self) -> Optional[List[Dict[str, Any]]]:
+        async def load():
+            return [{"id": doc["id"], "location": doc["location"], "rating": doc.get("rating")}
+                    for doc in self._approved_reviews() if "location" in doc]
+        return await self.cache.get("reviews", "points", load)
+
+    async def get_review_search_docs(self) -> Optional[List[Dict[str, Any]]]:
+        async def load():
+            return [_project(doc, SEARCH_PROJECTION) for doc in self._approved_reviews()]
+        return await self.cache.get("reviews", "search", load)
+
+    async def get_review_stats(self) -> Optional[Dict[str, Any]]:
+        return await self.cache.get("reviews", "stats", self._review_stats)
+
+    async def _review_stats(self) -> Dict[str, Any]:
+        reviews = list(self._approved_reviews())
+        histogram = {str(score): 0 for score in range(10, 0, -1)}
+        groups: Dict[str, Dict[Any, List[float]]] = {"postcode": {}, "service": {}}
+        rated = []
+        for doc in reviews:
+            rating = doc.get("rating")
+            if isinstance(rating, (int, float)):
+                rated.append(rating)
+                if str(math.floor(rating)) in histogram:
+                    histogram[str(math.floor(rating))] += 1
+            for field, group in groups.items():
+                group.setdefault(doc.get(field), []).append(rating)
+
+        def rows(group, key):
+            # Most reviews first, then by value with missing values first, as MongoDB sorts
+            ordered = sorted(group.items(), key=lambda item: (-len(item[1]), item[0] is not None, item[0] or ""))
+            result = []
+            for value, ratings in ordered:
+                numbers = [r for r in ratings if isinstance(r, (int, float))]
+                average = sum(numbers) / len(numbers) if numbers else 0
+                result.append({key: value, "count": len(ratings), "average_rating": round(average, 2)})
+            return result
+
+        image_counts = [len(doc.get("images") or []) for doc in reviews]
+        return {
+            "total_reviews": len(reviews),
+            "average_rating": round(sum(rated) / len(rated), 2) if rated else 0,
+            "rating_histogram": histogram,
+            "reviews_with_images": sum(1 for count in image_counts if count),
+            "total_images": sum(image_counts),
+            "by_postcode": rows(groups["postcode"], "postcode"),
+            "by_service": rows(groups["service"], "service"),
+        }
+
+    async def get_review_image_urls(self) -> List[str]:
+        return sorted({url for doc in self._approved_reviews() for url in doc.get("images") or []})
+
+    async def create_review(self, review: Review) -> str:
+        await self._insert("reviews", with_location(review.dict()))
+        return review.id
+
+    async def ingest_reviews(self, reviews: List[Dict[str, Any]], source: str, prune: bool = True,
+                             dry_run: bool = False) -> Dict[str, int]:
+        collection = self.collections["reviews"]
+        in_scope = [doc for doc in collection.all() if doc.get("source") == source
+                    or ("source" not in doc and isinstance(doc.get("created_at"), str))]
+        existing = [_project(doc, INGEST_PROJECTION) for doc in in_scope]
+        inserts, updates, deletes, unchanged = plan_ingest(existing, reviews, source, prune)
+        report = {"inserted": len(inserts), "updated": len(updates), "deleted": len(deletes),
+                  "unchanged": unchanged, "errors": 0}
+        if dry_run:
+            return report
+        for doc in inserts:
+            try:
+                collection.insert(doc)
+            except ValueError as e:
+                logger.error(f"Review ingest insert failed: {e}")
+                report["errors"] += 1
+        for review_id, fields in updates:
+            collection.replace({**collection.by_id[review_id], **fields})
+        for review_id in deletes:
+            collection.delete(review_id)
+        if inserts or updates or deletes:
+            await self._collection_changed("reviews")
+        return report
+
+    # Quote requests, contacts and gallery
+    async def create_quote_request(self, quote: QuoteRequest) -> str:
+        await self._insert("quote_requests", quote.dict())
+        return quote.id
+
+    async def get_quote_requests_page(self, limit: int, cursor: Optional[str] = None) -> Page:
+        return self._page("quote_requests", limit, cursor)
+
+    async def create_contact(self, contact: Contact) -> str:
+        await self._insert("contacts", contact.dict())
+        return contact.id
+
+    async def get_contacts_page(self, limit: int, cursor: Optional[str] = None) -> Page:
+        return self._page("contacts", limit, cursor)
+
+    async def get_gallery_images_page(self, limit: int, cursor: Optional[str] = None) -> Page:
+        return self._page("gallery", limit, cursor)
+
+    async def create_gallery_image(self, image: GalleryImage) -> str:
+        await self._insert("gallery", image.dict())
+        return image.id
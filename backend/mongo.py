@@ -0,0 +1,153 @@
+"""
+The app's single MongoDB client: pool, timeout, compression and server
+selection settings from the environment, plus connection pool checkout metrics
+so the pool can be sized for the number of workers.
+"""
+import importlib.util
+import os
+import threading
+import time
+from typing import Any, Dict, List
+import logging
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Compressor name -> module pymongo needs for it (zlib ships with Python)
+COMPRESSOR_MODULES = {'zstd': 'zstandard', 'snappy': 'snappy', 'zlib': 'zlib'}
+
+# Upper bounds (ms) of the checkout wait histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000)
+
+def _int_env(name: str):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else None
+
+def available_compressors(requested: str) -> List[str]:
+    """Requested compressors in preference order, minus those whose library isn't installed"""
+    compressors = []
+    for name in (c.strip().lower() for c in requested.split(',') if c.strip()):
+        module = COMPRESSOR_MODULES.get(name)
+        if module is None:
+            logger.warning(f"Unknown MongoDB compressor '{name}', ignoring")
+        elif importlib.util.find_spec(module) is None:
+            logger.warning(f"MongoDB compressor '{name}' needs the '{module}' package, ignoring")
+        else:
+            compressors.append(name)
+    return compressors
+
+def client_options() -> Dict[str, Any]:
+    """MongoClient keyword options from MONGO_* environment variables"""
+    options = {
+        # Size per worker process: total connections = workers x maxPoolSize
+        'maxPoolSize': _int_env('MONGO_MAX_POOL_SIZE') or 50,
+        'minPoolSize': _int_env('MONGO_MIN_POOL_SIZE') or 0,
+        'maxIdleTimeMS': _int_env('MONGO_MAX_IDLE_TIME_MS'),
+        'waitQueueTimeoutMS': _int_env('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+        'connectTimeoutMS': _int_env('MONGO_CONNECT_TIMEOUT_MS') or 10000,
+        'socketTimeoutMS': _int_env('MONGO_SOCKET_TIMEOUT_MS'),
+        'serverSelectionTimeoutMS': _int_env('MONGO_SERVER_SELECTION_TIMEOUT_MS') or 5000,
+        'localThresholdMS': _int_env('MONGO_LOCAL_THRESHOLD_MS'),
+        'appname': os.environ.get('MONGO_APP_NAME', 'pnm-gardeners-api'),
+    }
+    compressors = available_compressors(os.environ.get('MONGO_COMPRESSORS', ''))
+    if compressors:
+        options['compressors'] = compressors
+        if 'zlib' in compressors and _int_env('MONGO_ZLIB_LEVEL') is not None:
+            options['zlibCompressionLevel'] = _int_env('MONGO_ZLIB_LEVEL')
+    return {name: value for name, value in options.items() if value is not None}
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool events aggregated into checkout wait statistics.
+
+    pymongo publishes these from whichever thread is checking out a connection,
+    with the started and checked-out events for one checkout on the same thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.checkouts = 0
+        self.checkout_failures: Dict[str, int] = {}
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.checked_out = 0
+        self.open_connections = 0
+        self.pool_clears = 0
+
+    def _wait_ms(self) -> float:
+        started = getattr(self._local, 'started', None)
+        self._local.started = None
+        return (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait_ms = self._wait_ms()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+            bucket = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if wait_ms <= bound), len(WAIT_BUCKETS_MS))
+            self.wait_buckets[bucket] += 1
+
+    def connection_check_out_failed(self, event):
+        self._wait_ms()
+        with self._lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buckets = {f"le_{bound}ms": count for bound, count in zip(WAIT_BUCKETS_MS, self.wait_buckets)}
+            buckets[f"gt_{WAIT_BUCKETS_MS[-1]}ms"] = self.wait_buckets[-1]
+            return {
+                'checkouts': self.checkouts,
+                'checkout_failures': dict(self.checkout_failures),
+                'wait_avg_ms': round(self.wait_total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                'wait_max_ms': round(self.wait_max_ms, 3),
+                'wait_histogram': buckets,
+                'checked_out': self.checked_out,
+                'open_connections': self.open_connections,
+                'pool_clears': self.pool_clears,
+            }
+
+# Global pool metrics, shared by the app's client
+pool_metrics = PoolMetrics()
+
+def create_client() -> AsyncIOMotorClient:
+    options = client_options()
+    logger.info(f"Creating MongoDB client: {options}")
+    return AsyncIOMotorClient(os.environ['MONGO_URL'], event_listeners=[pool_metrics], **options)
@@ -0,0 +1,217 @@
+"""
+In-process read-through cache for rarely-changing MongoDB reads (services and
+approved reviews).
+
+Entries are fresh for a TTL, then served stale while a single background
+refresh runs. If MongoDB is unreachable, the last good value keeps being served
+until the stale limit. Writes through Database invalidate locally. Writes from
+other processes (admin scripts, other workers) are picked up either from a
+per-collection version counter or from a change stream, depending on
+QUERY_CACHE_INVALIDATION.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Collection holding one {_id: <collection name>, version: n} document per cached collection
+VERSIONS_COLLECTION = 'cache_versions'
+
+INVALIDATION_MODES = ('none', 'version', 'change_stream')
+
+async def bump_collection_version(db, collection_name: str):
+    """Tell every cache watching collection_name that its contents changed"""
+    await db[VERSIONS_COLLECTION].update_one({'_id': collection_name}, {'$inc': {'version': 1}}, upsert=True)
+
+class CacheEntry:
+    def __init__(self, value: Any):
+        self.value = value
+        self.fetched_at = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+class QueryCache:
+    def __init__(self):
+        self.enabled = os.environ.get('QUERY_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        self.ttl = float(os.environ.get('QUERY_CACHE_TTL', 60))
+        # How long past the TTL a value may still be served while refreshing or if MongoDB is down
+        self.stale_ttl = float(os.environ.get('QUERY_CACHE_STALE_TTL', 3600))
+        self.invalidation = os.environ.get('QUERY_CACHE_INVALIDATION', 'version').lower()
+        if self.invalidation not in INVALIDATION_MODES:
+            logger.warning(f"Unknown QUERY_CACHE_INVALIDATION '{self.invalidation}', falling back to version")
+            self.invalidation = 'version'
+        self.version_check_interval = float(os.environ.get('QUERY_CACHE_VERSION_CHECK_INTERVAL', 5))
+        # Page cursors come from clients, so bound how many distinct keys we keep
+        self.max_entries = int(os.environ.get('QUERY_CACHE_MAX_ENTRIES', 1000))
+
+        self._entries: Dict[Tuple[str, Hashable], CacheEntry] = {}
+        # Bumped on invalidation so refreshes started before it don't store old data
+        self._generations: Dict[str, int] = {}
+        self._loading: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+        self._refreshing: Dict[Tuple[str, Hashable], asyncio.Task] = {}
+
+        self._version_source: Optional[Callable[[], Awaitable[Dict[str, int]]]] = None
+        self._versions: Dict[str, int] = {}
+        self._versions_checked_at = 0.0
+        self._versions_lock = asyncio.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'refresh_failures': 0,
+            'served_stale_on_error': 0,
+            'invalidations': 0,
+        }
+
+    # Invalidation
+    def invalidate(self, namespace: str):
+        self._generations[namespace] = self._generations.get(namespace, 0) + 1
+        for key in [key for key in self._entries if key[0] == namespace]:
+            del self._entries[key]
+        self.stats['invalidations'] += 1
+
+    def use_version_source(self, source: Callable[[], Awaitable[Dict[str, int]]]):
+        """source() returns the current version of each cached collection"""
+        self._version_source = source
+
+    async def _check_versions(self):
+        if self.invalidation != 'version' or self._version_source is None:
+            return
+        if time.monotonic() - self._versions_checked_at < self.version_check_interval:
+            return
+        async with self._versions_lock:
+            if time.monotonic() - self._versions_checked_at < self.version_check_interval:
+                return
+            try:
+                versions = await self._version_source()
+            except Exception as e:
+                # Keep serving what we have; the TTL still bounds staleness
+                logger.warning(f"Failed to read cache versions: {e}")
+                versions = self._versions
+            for namespace, version in versions.items():
+                if namespace in self._versions and self._versions[namespace] != version:
+                    logger.info(f"{namespace} changed (version {version}), invalidating cache")
+                    self.invalidate(namespace)
+            self._versions = dict(versions)
+            self._versions_checked_at = time.monotonic()
+
+    def watch(self, db, namespaces):
+        """Invalidate from a change stream on db (needs a replica set)"""
+        if self.invalidation == 'change_stream' and self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch(db, list(namespaces)))
+
+    async def _watch(self, db, namespaces):
+        pipeline = [{'$match': {'ns.coll': {'$in': namespaces}}}]
+        while True:
+            try:
+                async with db.watch(pipeline) as stream:
+                    # Anything could have changed while we weren't watching
+                    for namespace in namespaces:
+                        self.invalidate(namespace)
+                    async for change in stream:
+                        self.invalidate(change['ns']['coll'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache change stream failed, retrying: {e}")
+                await asyncio.sleep(5)
+
+    async def stop(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+        for task in list(self._refreshing.values()):
+            task.cancel()
+
+    # Reads
+    async def _load(self, entry_key, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Run loader once per key no matter how many callers are waiting on it"""
+        future = self._loading.get(entry_key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        namespace = entry_key[0]
+        generation = self._generations.get(namespace, 0)
+        future = asyncio.get_running_loop().create_future()
+        self._loading[entry_key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unwatched failure doesn't log "exception never retrieved"
+            future.exception()
+            raise
+        else:
+            if self._generations.get(namespace, 0) == generation:
+                self._entries.pop(entry_key, None)
+                self._entries[entry_key] = CacheEntry(value)
+                while len(self._entries) > self.max_entries:
+                    # Oldest fetch first
+                    del self._entries[next(iter(self._entries))]
+            future.set_result(value)
+            return value
+        finally:
+            del self._loading[entry_key]
+
+    async def _refresh(self, entry_key, loader):
+        self.stats['refreshes'] += 1
+        try:
+            await self._load(entry_key, loader)
+        except Exception as e:
+            self.stats['refresh_failures'] += 1
+            logger.warning(f"Background refresh of {entry_key[0]} failed, serving stale data: {e}")
+        finally:
+            self._refreshing.pop(entry_key, None)
+
+    async def get(self, namespace: str, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached value for (namespace, key), calling loader() to (re)fill it"""
+        if not self.enabled:
+            return await loader()
+
+        await self._check_versions()
+        entry_key = (namespace, key)
+        entry = self._entries.get(entry_key)
+        if entry is not None:
+            age = entry.age()
+            if age < self.ttl:
+                self.stats['hits'] += 1
+                return entry.value
+            if age < self.ttl + self.stale_ttl:
+                self.stats['stale_hits'] += 1
+                if entry_key not in self._refreshing:
+                    self._refreshing[entry_key] = asyncio.create_task(self._refresh(entry_key, loader))
+                return entry.value
+
+        self.stats['misses'] += 1
+        try:
+            return await self._load(entry_key, loader)
+        except Exception:
+            if entry is not None:
+                # Too old to serve normally, but better than an error
+                self.stats['served_stale_on_error'] += 1
+                return entry.value
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'enabled': self.enabled,
+            'invalidation': self.invalidation,
+            'entries': len(self._entries),
+            'ttl': self.ttl,
+            'stale_ttl': self.stale_ttl,
+        }
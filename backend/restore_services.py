@@ -6,6 +6,7 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+from query_cache import bump_collection_version
 
 async def restore_services():
     ROOT_DIR = Path('/app/backend')
@@ -107,6 +108,8 @@ async def restore_services():
     # Insert all 9 services
     result = await db.services.insert_many(services_data)
     print(f"✅ Restored {len(result.inserted_ids)} services")
+    # Running API workers drop their cached services on their next version check
+    await bump_collection_version(db, "services")
     
     # Verify
     services = await db.services.find().to_list(100)
@@ -0,0 +1,194 @@
+"""
+Server-side clustering of review markers for the reviews map.
+
+Points are projected to Web Mercator and counted into a grid per zoom level,
+nested so each cell splits into 2x2 cells at the next zoom. A viewport query at
+a zoom is then a walk over that level's occupied cells. The grid is kept in
+sync with MongoDB incrementally: adding, removing or moving a review touches
+one cell per level.
+"""
+import asyncio
+import math
+import os
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Largest mercator latitude; points beyond it are clamped onto the edge
+MAX_LATITUDE = 85.05112878
+
+def project(lat: float, lng: float) -> Tuple[float, float]:
+    """Web Mercator position in the unit square, y growing southwards like map tiles"""
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    sin = math.sin(math.radians(lat))
+    x = (lng + 180.0) / 360.0
+    y = 0.5 - math.log((1 + sin) / (1 - sin)) / (4 * math.pi)
+    return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+def unproject(x: float, y: float) -> Tuple[float, float]:
+    lng = x * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return lat, lng
+
+class Cell:
+    __slots__ = ('count', 'rating_sum', 'x_sum', 'y_sum', 'ids')
+
+    def __init__(self):
+        self.count = 0
+        self.rating_sum = 0.0
+        self.x_sum = 0.0
+        self.y_sum = 0.0
+        self.ids = set()
+
+class ReviewClusterIndex:
+    def __init__(self):
+        self.max_zoom = int(os.environ.get('REVIEW_CLUSTER_MAX_ZOOM', 16))
+        # Grid cells per 256px map tile along each axis: 4 gives 64px clusters
+        self.cells_per_tile = int(os.environ.get('REVIEW_CLUSTER_CELLS_PER_TILE', 4))
+        self.levels: List[Dict[Tuple[int, int], Cell]] = [{} for _ in range(self.max_zoom + 1)]
+        # id -> (x, y, rating, lat, lng)
+        self.points: Dict[str, Tuple[float, float, float, float, float]] = {}
+        self._source = None
+        self._lock = asyncio.Lock()
+        self.stats = {'syncs': 0, 'added': 0, 'removed': 0}
+
+    def _cell_key(self, x: float, y: float, zoom: int) -> Tuple[int, int]:
+        size = (1 << zoom) * self.cells_per_tile
+        return int(x * size), int(y * size)
+
+    # Incremental updates
+    def add(self, review_id: str, lat: float, lng: float, rating: float):
+        if review_id in self.points:
+            self.remove(review_id)
+        x, y = project(lat, lng)
+        self.points[review_id] = (x, y, rating, lat, lng)
+        for zoom, level in enumerate(self.levels):
+            key = self._cell_key(x, y, zoom)
+            cell = level.get(key)
+            if cell is None:
+                cell = level[key] = Cell()
+            cell.count += 1
+            cell.rating_sum += rating
+            cell.x_sum += x
+            cell.y_sum += y
+            cell.ids.add(review_id)
+
+    def remove(self, review_id: str):
+        point = self.points.pop(review_id, None)
+        if point is None:
+            return
+        x, y, rating, _, _ = point
+        for zoom, level in enumerate(self.levels):
+            key = self._cell_key(x, y, zoom)
+            cell = level[key]
+            cell.count -= 1
+            cell.rating_sum -= rating
+            cell.x_sum -= x
+            cell.y_sum -= y
+            cell.ids.discard(review_id)
+            if cell.count == 0:
+                del level[key]
+
+    def sync(self, docs: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """Apply only the differences between the index and docs (id, location, rating)"""
+        wanted = {}
+        for doc in docs:
+            try:
+                lng, lat = doc['location']['coordinates']
+                wanted[doc['id']] = (float(lat), float(lng), float(doc.get('rating') or 0))
+            except (KeyError, TypeError, ValueError):
+                continue
+        removed = [review_id for review_id in self.points if review_id not in wanted]
+        for review_id in removed:
+            self.remove(review_id)
+        added = 0
+        for review_id, (lat, lng, rating) in wanted.items():
+            current = self.points.get(review_id)
+            if current is None or current[2:] != (rating, lat, lng):
+                self.add(review_id, lat, lng, rating)
+                added += 1
+        self.stats['syncs'] += 1
+        self.stats['added'] += added
+        self.stats['removed'] += len(removed)
+        return added, len(removed)
+
+    async def refresh(self, database):
+        """Sync from the database's cached review points when they have changed"""
+        async with self._lock:
+            docs = await database.get_review_points()
+            # The query cache hands back the same list until reviews change;
+            # None means the read failed, so keep serving what we have
+            if docs is None or docs is self._source:
+                return
+            added, removed = self.sync(docs)
+            self._source = docs
+            if added or removed:
+                logger.info(f"Review clusters updated: {added} added, {removed} removed, {len(self.points)} points")
+
+    # Queries
+    def _expansion_zoom(self, key: Tuple[int, int], zoom: int, count: int) -> Optional[int]:
+        """First zoom at which this cell's points fall into more than one cell"""
+        cx, cy = key
+        for next_zoom in range(zoom + 1, self.max_zoom + 1):
+            cx, cy = cx * 2, cy * 2
+            level = self.levels[next_zoom]
+            children = [(cx + i, cy + j) for i in (0, 1) for j in (0, 1) if (cx + i, cy + j) in level]
+            if len(children) > 1:
+                return next_zoom
+            if not children or level[children[0]].count != count:
+                return next_zoom
+            cx, cy = children[0]
+        # Past max_zoom reviews are returned individually, unless they share one spot
+        ids = self.levels[self.max_zoom][(cx, cy)].ids
+        if len({self.points[review_id][3:] for review_id in ids}) > 1:
+            return self.max_zoom + 1
+        return None
+
+    def query(self, bbox: Tuple[float, float, float, float], zoom: int) -> List[Dict[str, Any]]:
+        """Clusters (or single reviews) inside bbox=(minLng, minLat, maxLng, maxLat) at zoom"""
+        min_lng, min_lat, max_lng, max_lat = bbox
+        if zoom > self.max_zoom:
+            return [
+                {'lat': lat, 'lng': lng, 'count': 1, 'average_rating': rating, 'id': review_id}
+                for review_id, (_, _, rating, lat, lng) in self.points.items()
+                if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+            ]
+
+        zoom = max(0, zoom)
+        x0, y1 = project(min_lat, min_lng)
+        x1, y0 = project(max_lat, max_lng)
+        (cx0, cy0), (cx1, cy1) = self._cell_key(x0, y0, zoom), self._cell_key(x1, y1, zoom)
+        clusters = []
+        for key, cell in self.levels[zoom].items():
+            if not (cx0 <= key[0] <= cx1 and cy0 <= key[1] <= cy1):
+                continue
+            lat, lng = unproject(cell.x_sum / cell.count, cell.y_sum / cell.count)
+            cluster = {
+                'lat': round(lat, 6),
+                'lng': round(lng, 6),
+                'count': cell.count,
+                'average_rating': round(cell.rating_sum / cell.count, 2),
+            }
+            if cell.count == 1:
+                review_id = next(iter(cell.ids))
+                _, _, _, lat, lng = self.points[review_id]
+                cluster.update(lat=lat, lng=lng, id=review_id)
+            else:
+                cluster['expansion_zoom'] = self._expansion_zoom(key, zoom, cell.count)
+                if cluster['expansion_zoom'] is None:
+                    # Same spot at every zoom (e.g. one postcode); let the client list them
+                    cluster['ids'] = sorted(cell.ids)
+            clusters.append(cluster)
+        return clusters
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'points': len(self.points),
+            'max_zoom': self.max_zoom,
+            'cells': sum(len(level) for level in self.levels),
+        }
+
+# Global review cluster index instance
+review_clusters = ReviewClusterIndex()
@@ -0,0 +1,80 @@
+"""
+Planning for idempotent bulk review imports (Database.ingest_reviews).
+
+Each imported review gets a natural key, a hash of its service title and text
+(the parts of a scraped review that identify it). Diffing the import against
+what is stored, by key and then field by field, gives the inserts, updates and
+deletes to apply, so a re-import that changes nothing writes nothing and the
+collection is never empty mid-import.
+"""
+import hashlib
+import re
+import uuid
+from typing import Any, Dict, List, Tuple
+
+from review_map import with_location
+
+# Fields an import owns; anything else on a stored review (id, created_at, ...) is left alone
+INGEST_FIELDS = ("name", "rating", "date", "text", "service", "postcode", "lat", "lng", "images", "approved")
+
+INGEST_PROJECTION = {"_id": 0, "id": 1, "source": 1, "location": 1, **{field: 1 for field in INGEST_FIELDS}}
+
+INGEST_BATCH_SIZE = 500
+
+def ingest_scope(source: str) -> Dict[str, Any]:
+    """Stored reviews an import from source may update or delete: its own, plus
+    scripted reviews from before imports were tagged (ISO string created_at,
+    unlike reviews submitted through the API)"""
+    return {"$or": [
+        {"source": source},
+        {"source": {"$exists": False}, "created_at": {"$type": "string"}},
+    ]}
+
+def _normalize(value: Any) -> str:
+    return re.sub(r"\s+", " ", str(value or "")).strip().lower()
+
+def natural_key(doc: Dict[str, Any]) -> str:
+    raw = f"{_normalize(doc.get('service'))}\x1f{_normalize(doc.get('text'))}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _changes(current: Dict[str, Any], fields: Dict[str, Any], source: str) -> Dict[str, Any]:
+    """Fields to $set on a stored review to make it match an imported one"""
+    changed = {name: value for name, value in fields.items() if current.get(name) != value}
+    location = with_location({**current, **fields}).get("location")
+    if location is not None and location != current.get("location"):
+        changed["location"] = location
+    if current.get("source") != source:
+        changed["source"] = source
+    return changed
+
+def plan_ingest(existing: List[Dict[str, Any]], incoming: List[Dict[str, Any]], source: str,
+                prune: bool = True) -> Tuple[List[Dict[str, Any]], List[Tuple[str, Dict[str, Any]]], List[str], int]:
+    """(documents to insert, (id, fields to $set) updates, ids to delete, unchanged count)"""
+    stored: Dict[str, List[Dict[str, Any]]] = {}
+    for doc in sorted(existing, key=lambda doc: doc.get("id") or ""):
+        stored.setdefault(natural_key(doc), []).append(doc)
+    occurrences: Dict[str, int] = {}
+    inserts, updates, unchanged = [], [], 0
+    for doc in incoming:
+        key = natural_key(doc)
+        occurrences[key] = occurrences.get(key, 0) + 1
+        fields = {field: doc.get(field) for field in INGEST_FIELDS if field in doc}
+        candidates = stored.get(key)
+        if not candidates:
+            new_doc = {name: value for name, value in doc.items() if name != "location"}
+            # Derived from the key so re-running a failed import can't duplicate reviews
+            suffix = f"#{occurrences[key]}" if occurrences[key] > 1 else ""
+            new_doc["id"] = doc.get("id") or str(uuid.uuid5(uuid.NAMESPACE_URL, f"review:{source}:{key}{suffix}"))
+            new_doc["source"] = source
+            inserts.append(with_location(new_doc))
+            continue
+        # Reviews sharing a key (same title and text) pair up with the closest stored match
+        changes = [_changes(current, fields, source) for current in candidates]
+        best = min(range(len(candidates)), key=lambda i: len(changes[i]))
+        current = candidates.pop(best)
+        if changes[best]:
+            updates.append((current["id"], changes[best]))
+        else:
+            unchanged += 1
+    deletes = [doc["id"] for docs in stored.values() for doc in docs] if prune else []
+    return inserts, updates, deletes, unchanged
@@ -0,0 +1,91 @@
+"""
+Geospatial pieces of the reviews map: the GeoJSON point stored on each review
+(next to the legacy lat/lng floats) and parsing of viewport queries.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+# Default and largest number of markers returned for one viewport
+MAP_MARKERS_DEFAULT = 500
+MAP_MARKERS_MAX = 2000
+
+# What the map needs per marker; the first image doubles as the thumbnail
+MARKER_PROJECTION = {"_id": 0, "id": 1, "location": 1, "rating": 1, "images": {"$slice": 1}}
+
+# What the cluster index keeps per review
+POINT_PROJECTION = {"_id": 0, "id": 1, "location": 1, "rating": 1}
+
+def _valid_coordinates(lat: Any, lng: Any) -> bool:
+    numeric = all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (lat, lng))
+    return numeric and -90 <= lat <= 90 and -180 <= lng <= 180
+
+def geo_point(lat: Any, lng: Any) -> Optional[Dict[str, Any]]:
+    """GeoJSON point for a review's coordinates, or None if they are missing or invalid"""
+    if not _valid_coordinates(lat, lng):
+        return None
+    return {"type": "Point", "coordinates": [float(lng), float(lat)]}
+
+def with_location(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the GeoJSON location a review document should carry"""
+    point = geo_point(doc.get("lat"), doc.get("lng"))
+    if point is not None:
+        doc["location"] = point
+    return doc
+
+# Filter and update for reviews stored before the location field existed
+BACKFILL_FILTER = {
+    "location": {"$exists": False},
+    "lat": {"$type": "number", "$gte": -90, "$lte": 90},
+    "lng": {"$type": "number", "$gte": -180, "$lte": 180},
+}
+BACKFILL_UPDATE = [{"$set": {"location": {"type": "Point", "coordinates": [{"$toDouble": "$lng"}, {"$toDouble": "$lat"}]}}}]
+
+def _floats(value: str, count: int, name: str):
+    try:
+        numbers = [float(part) for part in value.split(",")]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count:
+        raise ValueError(f"{name} must be {count} comma-separated numbers")
+    return numbers
+
+def parse_bbox(value: str) -> Tuple[float, float, float, float]:
+    """'minLng,minLat,maxLng,maxLat' (the Leaflet toBBoxString() order)"""
+    min_lng, min_lat, max_lng, max_lat = _floats(value, 4, "bbox")
+    if not (_valid_coordinates(min_lat, min_lng) and _valid_coordinates(max_lat, max_lng)):
+        raise ValueError("bbox is out of range")
+    if min_lat > max_lat or min_lng > max_lng:
+        raise ValueError("bbox must be minLng,minLat,maxLng,maxLat")
+    return min_lng, min_lat, max_lng, max_lat
+
+def parse_point(value: str) -> Tuple[float, float]:
+    """'lat,lng'"""
+    lat, lng = _floats(value, 2, "near")
+    if not _valid_coordinates(lat, lng):
+        raise ValueError("near is out of range")
+    return lat, lng
+
+def bbox_filter(bbox: Tuple[float, float, float, float]) -> Dict[str, Any]:
+    min_lng, min_lat, max_lng, max_lat = bbox
+    if max_lng - min_lng >= 180:
+        # A polygon this wide is ambiguous on a sphere; the viewport covers everything anyway
+        return {"location": {"$exists": True}, "location.coordinates.1": {"$gte": min_lat, "$lte": max_lat}}
+    ring = [[min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat], [min_lng, max_lat], [min_lng, min_lat]]
+    return {"location": {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}}
+
+def near_filter(lat: float, lng: float, max_distance: Optional[float] = None) -> Dict[str, Any]:
+    """Nearest first; max_distance in metres"""
+    near: Dict[str, Any] = {"$geometry": {"type": "Point", "coordinates": [lng, lat]}}
+    if max_distance is not None:
+        near["$maxDistance"] = max_distance
+    return {"location": {"$near": near}}
+
+def marker(doc: Dict[str, Any]) -> Dict[str, Any]:
+    lng, lat = doc["location"]["coordinates"]
+    images = doc.get("images") or []
+    return {
+        "id": doc.get("id"),
+        "lat": lat,
+        "lng": lng,
+        "rating": doc.get("rating"),
+        "thumbnail": images[0] if images else None,
+    }
@@ -0,0 +1,273 @@
+"""
+Full-text search over approved reviews.
+
+An in-process inverted index over review text, service and postcode, ranked
+with BM25 (service and postcode matches weigh more than words in the text).
+Each review has a slot in a set of numpy arrays, so scoring a posting list and
+applying the rating/postcode/service filters are array operations rather than
+Python loops. Like the cluster index it syncs incrementally from the
+query-cached review documents: only added, edited or removed reviews touch
+the postings.
+"""
+import asyncio
+import html
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SEARCH_RESULTS_DEFAULT = 20
+SEARCH_RESULTS_MAX = 100
+
+# Review fields returned with each result; the text is replaced by its snippet
+RESULT_FIELDS = ("id", "name", "rating", "date", "service", "postcode", "images")
+
+# What the index keeps per review
+SEARCH_PROJECTION = {"_id": 0, **{field: 1 for field in RESULT_FIELDS}, "text": 1}
+
+# Term frequency multiplier per field
+FIELD_WEIGHTS = {"text": 1, "service": 3, "postcode": 3}
+
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from had has have he i in is it its me my of on or our so
+that the their them they this to was we were with you your very all just would will been
+""".split())
+
+WORD = re.compile(r"[a-z0-9]+")
+
+def stem(word: str) -> str:
+    """Crude suffix stripping so 'hedges'/'hedge' and 'trimming'/'trimmed'/'trim' match"""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    for suffix in ("ing", "ed"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            word = word[:-len(suffix)]
+            if len(word) > 2 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            return word
+    if len(word) > 3 and word.endswith("es") and (word[-3] in "sxz" or word[-4:-2] in ("ch", "sh")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def terms(text: Optional[str]) -> List[str]:
+    return [stem(word) for word in WORD.findall((text or "").lower()) if word not in STOP_WORDS]
+
+def make_snippet(text: str, query_terms: set, width: int = 160) -> str:
+    """HTML-escaped excerpt around the densest run of matches, with matches in <mark>"""
+    matches = [m for m in WORD.finditer(text.lower()) if stem(m.group()) in query_terms]
+    start = 0
+    if matches:
+        # Window starting at the match that has the most other matches within width
+        best = max(range(len(matches)), key=lambda i: sum(
+            1 for m in matches[i:] if m.end() - matches[i].start() <= width))
+        start = max(0, matches[best].start() - 30)
+        if start:
+            space = text.rfind(" ", 0, start)
+            start = space + 1 if space >= 0 else start
+    end = min(len(text), start + width)
+    if end < len(text):
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+
+    parts, position = [], start
+    for m in matches:
+        if m.start() < start or m.end() > end:
+            continue
+        parts.append(html.escape(text[position:m.start()]))
+        parts.append(f"<mark>{html.escape(text[m.start():m.end()])}</mark>")
+        position = m.end()
+    parts.append(html.escape(text[position:end]))
+    return ("…" if start else "") + "".join(parts) + ("…" if end < len(text) else "")
+
+class ReviewSearchIndex:
+    def __init__(self):
+        self.k1 = float(os.environ.get('REVIEW_SEARCH_BM25_K1', 1.2))
+        self.b = float(os.environ.get('REVIEW_SEARCH_BM25_B', 0.75))
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        # review id <-> array slot; slots of removed reviews are reused
+        self.slots: Dict[str, int] = {}
+        self.slot_ids: List[Optional[str]] = []
+        self._free: List[int] = []
+        # Per-slot columns: alive flag, BM25 document length and the filter fields
+        self.alive = np.zeros(0, dtype=bool)
+        self.lengths = np.zeros(0)
+        self.ratings = np.zeros(0)
+        self.postcodes = np.zeros(0, dtype=np.int32)
+        self.services = np.zeros(0, dtype=np.int32)
+        # Filter values -> small integer codes (0 is "none")
+        self._codes: Dict[str, Dict[str, int]] = {'postcode': {}, 'service': {}}
+        # term -> {slot: weighted term frequency}, and the same as arrays once queried
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.doc_terms: Dict[int, Dict[str, int]] = {}
+        self.total_length = 0
+        self._source = None
+        self._lock = asyncio.Lock()
+        self.stats = {'syncs': 0, 'added': 0, 'removed': 0, 'queries': 0}
+
+    def _code(self, field: str, value: Optional[str], create: bool = True) -> int:
+        if not value:
+            return 0
+        key = value.strip().lower()
+        codes = self._codes[field]
+        if key not in codes and create:
+            codes[key] = len(codes) + 1
+        return codes.get(key, -1)
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        slot = len(self.slot_ids)
+        self.slot_ids.append(None)
+        if slot >= len(self.alive):
+            size = max(1024, 2 * len(self.alive))
+            for name in ('alive', 'lengths', 'ratings', 'postcodes', 'services'):
+                column = getattr(self, name)
+                grown = np.zeros(size, dtype=column.dtype)
+                grown[:len(column)] = column
+                setattr(self, name, grown)
+        return slot
+
+    # Incremental updates
+    def add(self, doc: Dict[str, Any]):
+        review_id = doc["id"]
+        if review_id in self.docs:
+            self.remove(review_id)
+        counts: Dict[str, int] = {}
+        length = 0
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in terms(doc.get(field)):
+                counts[term] = counts.get(term, 0) + weight
+                length += 1
+        slot = self._allocate()
+        self.docs[review_id] = doc
+        self.slots[review_id] = slot
+        self.slot_ids[slot] = review_id
+        self.alive[slot] = True
+        self.lengths[slot] = length
+        self.ratings[slot] = doc.get("rating") or 0
+        self.postcodes[slot] = self._code('postcode', doc.get("postcode"))
+        self.services[slot] = self._code('service', doc.get("service"))
+        self.doc_terms[slot] = counts
+        self.total_length += length
+        for term, count in counts.items():
+            self.postings.setdefault(term, {})[slot] = count
+            self._arrays.pop(term, None)
+
+    def remove(self, review_id: str):
+        if self.docs.pop(review_id, None) is None:
+            return
+        slot = self.slots.pop(review_id)
+        for term in self.doc_terms.pop(slot):
+            posting = self.postings[term]
+            del posting[slot]
+            if not posting:
+                del self.postings[term]
+            self._arrays.pop(term, None)
+        self.total_length -= int(self.lengths[slot])
+        self.alive[slot] = False
+        self.slot_ids[slot] = None
+        self._free.append(slot)
+
+    def sync(self, docs: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """Apply only the reviews that were added, edited or removed since the last sync"""
+        wanted = {doc["id"]: doc for doc in docs if doc.get("id")}
+        removed = [review_id for review_id in self.docs if review_id not in wanted]
+        for review_id in removed:
+            self.remove(review_id)
+        added = 0
+        for review_id, doc in wanted.items():
+            if self.docs.get(review_id) != doc:
+                self.add(doc)
+                added += 1
+        self.stats['syncs'] += 1
+        self.stats['added'] += added
+        self.stats['removed'] += len(removed)
+        return added, len(removed)
+
+    async def refresh(self, database):
+        """Sync from the database's cached review documents when they have changed"""
+        async with self._lock:
+            docs = await database.get_review_search_docs()
+            # Same list object until the reviews cache is invalidated; None means the read failed
+            if docs is None or docs is self._source:
+                return
+            added, removed = self.sync(docs)
+            self._source = docs
+            if added or removed:
+                logger.info(f"Review search index updated: {added} added, {removed} removed, {len(self.docs)} reviews")
+
+    # Queries
+    def _posting_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            posting = self.postings[term]
+            arrays = self._arrays[term] = (np.fromiter(posting.keys(), dtype=np.intp, count=len(posting)),
+                                           np.fromiter(posting.values(), dtype=float, count=len(posting)))
+        return arrays
+
+    def _filter_mask(self, min_rating: Optional[float], max_rating: Optional[float],
+                     postcode: Optional[str], service: Optional[str]) -> np.ndarray:
+        size = len(self.slot_ids)
+        mask = self.alive[:size].copy()
+        if min_rating is not None:
+            mask &= self.ratings[:size] >= min_rating
+        if max_rating is not None:
+            mask &= self.ratings[:size] <= max_rating
+        if postcode is not None:
+            mask &= self.postcodes[:size] == self._code('postcode', postcode, create=False)
+        if service is not None:
+            mask &= self.services[:size] == self._code('service', service, create=False)
+        return mask
+
+    def search(self, query: str, limit: int = SEARCH_RESULTS_DEFAULT, offset: int = 0,
+               min_rating: Optional[float] = None, max_rating: Optional[float] = None,
+               postcode: Optional[str] = None, service: Optional[str] = None) -> Dict[str, Any]:
+        """BM25-ranked reviews matching any query term, best first, with highlighted snippets"""
+        self.stats['queries'] += 1
+        query_terms = set(terms(query))
+        indexed_terms = [term for term in query_terms if term in self.postings]
+        if not indexed_terms:
+            return {"query": query, "total": 0, "results": []}
+
+        size = len(self.slot_ids)
+        count = len(self.docs)
+        average_length = self.total_length / count or 1.0
+        scores = np.zeros(size)
+        matched = np.zeros(size, dtype=bool)
+        for term in indexed_terms:
+            slots, tf = self._posting_arrays(term)
+            idf = math.log(1 + (count - len(slots) + 0.5) / (len(slots) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[slots] / average_length)
+            scores[slots] += idf * tf * (self.k1 + 1) / (tf + norm)
+            matched[slots] = True
+
+        matched &= self._filter_mask(min_rating, max_rating, postcode, service)
+        candidates = np.flatnonzero(matched)
+        wanted = offset + limit
+        if len(candidates) > wanted:
+            candidates = candidates[np.argpartition(-scores[candidates], wanted - 1)[:wanted]]
+        # Best first; equal scores in slot order so pages are stable
+        ranked = candidates[np.lexsort((candidates, -scores[candidates]))][offset:]
+
+        results = []
+        for slot in ranked:
+            doc = self.docs[self.slot_ids[slot]]
+            result = {field: doc.get(field) for field in RESULT_FIELDS}
+            result["score"] = round(float(scores[slot]), 4)
+            result["snippet"] = make_snippet(doc.get("text") or "", query_terms)
+            results.append(result)
+        return {"query": query, "total": int(matched.sum()), "results": results}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'reviews': len(self.docs), 'terms': len(self.postings)}
+
+# Global review search index instance
+review_search = ReviewSearchIndex()
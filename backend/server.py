@@ -1,12 +1,12 @@
-from fastapi import FastAPI, APIRouter, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
+import orjson
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 # Import models and database
@@ -15,20 +15,41 @@ from models import (
     QuoteRequest, QuoteRequestCreate, Contact, ContactCreate,
     GalleryImage, GalleryImageCreate, MessageResponse, ErrorResponse
 )
-from database import Database
+from storage import create_storage
+from fast_json import ListSerializer
+from review_map import MAP_MARKERS_DEFAULT, MAP_MARKERS_MAX, parse_bbox, parse_point
+from review_clusters import review_clusters
+from review_search import SEARCH_RESULTS_DEFAULT, SEARCH_RESULTS_MAX, review_search
+from mongo import pool_metrics
 from email_service import email_service
-from image_proxy import router as image_proxy_router
+from http_headers import accepts_encoding, etag_matches
+from gallery import gallery_store, gallery_rebuild, photo_metadata_key, GALLERY_SORTS
+from image_proxy import router as image_proxy_router, close_client as close_image_proxy_client
+from image_transform import shutdown_executor as shutdown_image_transforms
+from image_prewarm import router as image_prewarm_router, image_prewarmer
+from image_metadata import image_metadata_index
+from image_keys import canonical_image_key
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db_client = client[os.environ['DB_NAME']]
+# Storage backend (STORAGE_BACKEND, MongoDB by default); it connects in the startup event
+database = create_storage()
 
-# Initialize database helper
-database = Database()
+# Largest page the paginated gallery endpoints will return
+GALLERY_PAGE_MAX = int(os.environ.get('GALLERY_PAGE_MAX', 100))
+
+# Page sizes for the keyset-paginated listings; the next page's cursor is sent in X-Next-Cursor
+LIST_PAGE_DEFAULT = int(os.environ.get('LIST_PAGE_DEFAULT', 50))
+LIST_PAGE_MAX = int(os.environ.get('LIST_PAGE_MAX', 200))
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+# Render list responses without re-validating every document (same bytes as response_model)
+service_serializer = ListSerializer(Service)
+review_serializer = ListSerializer(Review)
+quote_serializer = ListSerializer(QuoteRequest)
+contact_serializer = ListSerializer(Contact)
+gallery_serializer = ListSerializer(GalleryImage)
 
 # Create the main app
 app = FastAPI(
@@ -51,24 +72,70 @@ logger = logging.getLogger(__name__)
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting up PNM Gardeners API...")
+    database.connect()
     try:
         await database.seed_initial_data()
         logger.info("Database initialization completed")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
 
+    try:
+        report = await database.ensure_indexes()
+        logger.info(f"Indexes ensured: {len(report['existing'])} existing, "
+                    f"created {report['created'] or 'none'}, failed {report['failed'] or 'none'}")
+    except Exception as e:
+        logger.error(f"Failed to ensure indexes: {e}")
+
+    try:
+        backfilled = await database.backfill_review_locations()
+        if backfilled:
+            logger.info(f"Added GeoJSON locations to {backfilled} reviews")
+    except Exception as e:
+        logger.error(f"Failed to backfill review locations: {e}")
+
+    database.start_cache_invalidation()
+
+    try:
+        await review_clusters.refresh(database)
+    except Exception as e:
+        logger.error(f"Failed to build review clusters: {e}")
+
+    try:
+        await review_search.refresh(database)
+    except Exception as e:
+        logger.error(f"Failed to build review search index: {e}")
+
+    if image_prewarmer.on_startup:
+        image_prewarmer.start(database)
+    else:
+        image_prewarmer.database = database
+
+def _list_response(serializer: ListSerializer, docs, next_cursor: Optional[str] = None) -> Response:
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return Response(content=serializer.render(docs), media_type="application/json", headers=headers)
+
 # Health check endpoint
 @api_router.get("/", response_model=MessageResponse)
 async def root():
     return MessageResponse(message="PNM Gardeners API is running")
 
+@api_router.get("/db/stats")
+async def get_db_stats():
+    """MongoDB pool checkout waits, query cache and review index counters"""
+    return {
+        "pool": pool_metrics.get_stats(),
+        "query_cache": database.cache.get_stats(),
+        "review_clusters": review_clusters.get_stats(),
+        "review_search": review_search.get_stats(),
+    }
+
 # Services Endpoints
 @api_router.get("/services", response_model=List[Service])
 async def get_all_services():
     """Get all gardening services"""
     try:
         services = await database.get_all_services()
-        return services
+        return _list_response(service_serializer, services)
     except Exception as e:
         logger.error(f"Error fetching services: {e}")
         raise HTTPException(
@@ -98,11 +165,16 @@ async def get_service(service_id: str):
 
 # Reviews Endpoints
 @api_router.get("/reviews", response_model=List[Review])
-async def get_all_reviews():
-    """Get all approved customer reviews"""
+async def get_all_reviews(
+    limit: int = Query(LIST_PAGE_DEFAULT, ge=1, le=LIST_PAGE_MAX),
+    cursor: Optional[str] = None
+):
+    """Approved customer reviews, newest first, one page at a time"""
     try:
-        reviews = await database.get_all_reviews()
-        return reviews
+        reviews, next_cursor = await database.get_reviews_page(limit, cursor)
+        return _list_response(review_serializer, reviews, next_cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching reviews: {e}")
         raise HTTPException(
@@ -110,6 +182,87 @@ async def get_all_reviews():
             detail="Failed to fetch reviews"
         )
 
+@api_router.get("/reviews/map")
+async def get_review_map_markers(
+    bbox: Optional[str] = Query(None, description="minLng,minLat,maxLng,maxLat"),
+    near: Optional[str] = Query(None, description="lat,lng; results are nearest first"),
+    max_distance: Optional[float] = Query(None, gt=0, description="Metres from near"),
+    limit: int = Query(MAP_MARKERS_DEFAULT, ge=1, le=MAP_MARKERS_MAX)
+):
+    """Markers (id, position, rating, thumbnail) for approved reviews in a map viewport"""
+    if (bbox is None) == (near is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Pass either bbox or near")
+    try:
+        box = parse_bbox(bbox) if bbox is not None else None
+        point = parse_point(near) if near is not None else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    markers = await database.get_review_markers(bbox=box, near=point, max_distance=max_distance, limit=limit)
+    return Response(content=orjson.dumps(markers), media_type="application/json")
+
+@api_router.get("/reviews/clusters")
+async def get_review_clusters(
+    bbox: str = Query(..., description="minLng,minLat,maxLng,maxLat"),
+    zoom: int = Query(..., ge=0, le=30, description="Map zoom level")
+):
+    """Review clusters (count, average rating, centroid) for a map viewport at a zoom level"""
+    try:
+        box = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    await review_clusters.refresh(database)
+    clusters = review_clusters.query(box, zoom)
+    return Response(content=orjson.dumps({"zoom": zoom, "clusters": clusters}), media_type="application/json")
+
+@api_router.get("/reviews/search")
+async def search_reviews(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in review text, service or postcode"),
+    min_rating: Optional[float] = Query(None, ge=1, le=10),
+    max_rating: Optional[float] = Query(None, ge=1, le=10),
+    postcode: Optional[str] = Query(None, description="Exact postcode district, e.g. SW19"),
+    service: Optional[str] = Query(None, description="Exact service name, e.g. Hedge Trimming"),
+    limit: int = Query(SEARCH_RESULTS_DEFAULT, ge=1, le=SEARCH_RESULTS_MAX),
+    offset: int = Query(0, ge=0, le=1000)
+):
+    """Relevance-ranked approved reviews with highlighted snippets"""
+    await review_search.refresh(database)
+    results = review_search.search(q, limit=limit, offset=offset, min_rating=min_rating, max_rating=max_rating,
+                                   postcode=postcode, service=service)
+    return Response(content=orjson.dumps(results), media_type="application/json")
+
+@api_router.get("/reviews/stats")
+async def get_review_stats():
+    """Aggregate statistics for approved reviews (ratings, postcodes, services, photos)"""
+    stats = await database.get_review_stats()
+    if stats is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch review stats"
+        )
+    return stats
+
+@api_router.get("/reviews/image-metadata")
+async def get_review_image_metadata():
+    """Dimensions, dominant colour and placeholders for approved review images, keyed by URL"""
+    try:
+        await image_metadata_index.refresh()
+        urls = await database.get_review_image_urls()
+    except Exception as e:
+        logger.error(f"Error fetching review image metadata: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch review image metadata"
+        )
+    
+    metadata = {}
+    for url in urls:
+        meta = image_metadata_index.get(canonical_image_key(url))
+        if meta:
+            metadata[url] = meta
+    return metadata
+
 @api_router.post("/reviews", response_model=MessageResponse)
 async def create_review(review_data: ReviewCreate):
     """Submit a new customer review"""
@@ -198,11 +351,16 @@ async def create_quote_request(quote_data: QuoteRequestCreate):
         )
 
 @api_router.get("/quotes", response_model=List[QuoteRequest])
-async def get_all_quotes():
-    """Get all quote requests (admin endpoint)"""
+async def get_all_quotes(
+    limit: int = Query(LIST_PAGE_DEFAULT, ge=1, le=LIST_PAGE_MAX),
+    cursor: Optional[str] = None
+):
+    """Quote requests, newest first, one page at a time (admin endpoint)"""
     try:
-        quotes = await database.get_all_quote_requests()
-        return quotes
+        quotes, next_cursor = await database.get_quote_requests_page(limit, cursor)
+        return _list_response(quote_serializer, quotes, next_cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching quotes: {e}")
         raise HTTPException(
@@ -254,11 +412,16 @@ async def create_contact(contact_data: ContactCreate):
         )
 
 @api_router.get("/contacts", response_model=List[Contact])
-async def get_all_contacts():
-    """Get all contact form submissions (admin endpoint)"""
+async def get_all_contacts(
+    limit: int = Query(LIST_PAGE_DEFAULT, ge=1, le=LIST_PAGE_MAX),
+    cursor: Optional[str] = None
+):
+    """Contact form submissions, newest first, one page at a time (admin endpoint)"""
     try:
-        contacts = await database.get_all_contacts()
-        return contacts
+        contacts, next_cursor = await database.get_contacts_page(limit, cursor)
+        return _list_response(contact_serializer, contacts, next_cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching contacts: {e}")
         raise HTTPException(
@@ -268,11 +431,16 @@ async def get_all_contacts():
 
 # Gallery Endpoints
 @api_router.get("/gallery", response_model=List[GalleryImage])
-async def get_gallery_images():
-    """Get all gallery images"""
+async def get_gallery_images(
+    limit: int = Query(LIST_PAGE_DEFAULT, ge=1, le=LIST_PAGE_MAX),
+    cursor: Optional[str] = None
+):
+    """Gallery images, newest first, one page at a time"""
     try:
-        images = await database.get_all_gallery_images()
-        return images
+        images, next_cursor = await database.get_gallery_images_page(limit, cursor)
+        return _list_response(gallery_serializer, images, next_cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching gallery images: {e}")
         raise HTTPException(
@@ -280,27 +448,43 @@ async def get_gallery_images():
             detail="Failed to fetch gallery images"
         )
 
+def _gallery_pending_response() -> JSONResponse:
+    """No gallery data yet - build it in the background and ask the client to come back"""
+    if gallery_rebuild.start():
+        logger.info("Gallery data file not found, rebuilding it in the background...")
+    elif not gallery_rebuild.running:
+        # The last rebuild failed recently; wait out the cooldown rather than crawl again
+        retry_after = max(1, int(gallery_rebuild.cooldown_remaining()))
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"error": "Gallery data is unavailable, please retry later", "rebuild": gallery_rebuild.status},
+            headers={"Retry-After": str(retry_after)}
+        )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"message": "Gallery data is being generated, please retry shortly", "rebuild": gallery_rebuild.status},
+        headers={"Retry-After": "10"}
+    )
+
 @api_router.get("/gallery/real-photos")
-async def get_real_gallery_photos():
+async def get_real_gallery_photos(request: Request):
     """Get real Google Drive gallery photos organized by service"""
     try:
-        import json
-        gallery_data_path = '/app/real_gallery_data.json'
+        snapshot = await gallery_store.get_snapshot()
+        if snapshot is None:
+            return _gallery_pending_response()
         
-        if not os.path.exists(gallery_data_path):
-            # Create the gallery data if it doesn't exist
-            logger.info("Gallery data file not found, creating it...")
-            import subprocess
-            result = subprocess.run(['python', '/app/create_gallery_data.py'], 
-                                  capture_output=True, text=True, cwd='/app')
-            if result.returncode != 0:
-                raise Exception(f"Failed to create gallery data: {result.stderr}")
+        await image_metadata_index.refresh()
+        payload = await snapshot.full_payload(image_metadata_index)
         
-        with open(gallery_data_path, 'r') as f:
-            gallery_data = json.load(f)
+        headers = {'ETag': payload.etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+        if etag_matches(request.headers.get('if-none-match', ''), payload.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
         
-        logger.info(f"Serving real gallery data with {len(gallery_data)} service albums")
-        return gallery_data
+        if accepts_encoding(request.headers.get('accept-encoding', ''), 'gzip'):
+            headers['Content-Encoding'] = 'gzip'
+            return Response(content=payload.gzip_payload, media_type="application/json", headers=headers)
+        return Response(content=payload.payload, media_type="application/json", headers=headers)
         
     except Exception as e:
         logger.error(f"Error fetching real gallery photos: {e}")
@@ -309,6 +493,71 @@ async def get_real_gallery_photos():
             detail=f"Failed to fetch real gallery photos: {str(e)}"
         )
 
+@api_router.get("/gallery/albums")
+async def get_gallery_albums(request: Request):
+    """Album summaries (name, photo count, cover) without the photo lists"""
+    snapshot = await gallery_store.get_snapshot()
+    if snapshot is None:
+        return _gallery_pending_response()
+    
+    headers = {'ETag': snapshot.etag, 'Cache-Control': 'no-cache'}
+    if etag_matches(request.headers.get('if-none-match', ''), snapshot.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=snapshot.albums_payload, media_type="application/json", headers=headers)
+
+@api_router.get("/gallery/albums/{service_name}/photos")
+async def get_gallery_album_photos(
+    service_name: str,
+    limit: int = Query(24, ge=1, le=GALLERY_PAGE_MAX),
+    cursor: Optional[str] = None,
+    sort: str = Query('default', description="default, newest, oldest or name")
+):
+    """One page of an album's photos; pass next_cursor back to get the following page"""
+    if sort not in GALLERY_SORTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid sort, expected one of: {', '.join(GALLERY_SORTS)}"
+        )
+    snapshot = await gallery_store.get_snapshot()
+    if snapshot is None:
+        return _gallery_pending_response()
+    
+    album = snapshot.albums.get(service_name)
+    if album is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Album not found")
+    try:
+        photos, next_cursor = album.page(sort, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    await image_metadata_index.refresh()
+    photos = image_metadata_index.annotate(photos, photo_metadata_key)
+    
+    return {
+        "service_name": service_name,
+        "photo_count": album.summary['photo_count'],
+        "sort": sort,
+        "photos": photos,
+        "next_cursor": next_cursor
+    }
+
+@api_router.get("/gallery/rebuild")
+async def get_gallery_rebuild_status():
+    """Status of the current or last gallery rebuild"""
+    snapshot = gallery_store.snapshot
+    return {
+        **gallery_rebuild.status,
+        "data_version": gallery_store.version,
+        "data_loaded_at": snapshot.loaded_at if snapshot else None,
+    }
+
+@api_router.post("/gallery/rebuild", status_code=status.HTTP_202_ACCEPTED)
+async def start_gallery_rebuild():
+    """Regenerate the gallery dataset from Google Drive in the background (admin endpoint).
+    Forces a rebuild even while a failed one is cooling down."""
+    started = gallery_rebuild.start(force=True)
+    return {"started": started, **gallery_rebuild.status}
+
 @api_router.post("/gallery", response_model=MessageResponse)
 async def create_gallery_image(image_data: GalleryImageCreate):
     """Upload a new gallery image (admin endpoint)"""
@@ -345,6 +594,7 @@ async def general_exception_handler(request, exc):
 # Include the router in the main app
 app.include_router(api_router)
 app.include_router(image_proxy_router)
+app.include_router(image_prewarm_router)
 
 # CORS middleware
 app.add_middleware(
@@ -353,12 +603,15 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await image_prewarmer.stop()
     await database.close()
-    client.close()
+    await close_image_proxy_client()
+    shutdown_image_transforms()
     logger.info("Database connections closed")
 if __name__ == "__main__":
     import uvicorn
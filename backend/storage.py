@@ -0,0 +1,197 @@
+"""
+The storage interface the API is written against, and the pieces every
+backend shares: API projections, the created_at ordering and page cursors.
+
+STORAGE_BACKEND picks the implementation: "mongo" (database.Database, the
+default) or "memory" (memory_storage.MemoryStorage, which needs no external
+services and is meant for local runs and load-testing the API in isolation).
+"""
+import base64
+import importlib
+import json
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from models import Service, Review, QuoteRequest, Contact, GalleryImage
+from query_cache import QueryCache
+
+logger = logging.getLogger(__name__)
+
+# STORAGE_BACKEND value -> "module:class"
+STORAGE_BACKENDS = {
+    "mongo": "database:Database",
+    "memory": "memory_storage:MemoryStorage",
+}
+
+def model_projection(model) -> Dict[str, int]:
+    """Only the fields the API model serializes, leaving out _id and anything internal"""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+PROJECTIONS = {
+    "services": model_projection(Service),
+    "reviews": model_projection(Review),
+    "quote_requests": model_projection(QuoteRequest),
+    "contacts": model_projection(Contact),
+    "gallery": model_projection(GalleryImage),
+}
+
+# created_at is a BSON date for API-created documents but an ISO string for
+# seeded/scripted ones. MongoDB sorts by type first, in this order (lowest first).
+CREATED_AT_TYPES = ("null", "number", "string", "date")
+
+def created_at_type(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, datetime):
+        return "date"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, (int, float)):
+        return "number"
+    raise ValueError(f"Unsupported created_at value: {value!r}")
+
+def sort_key(doc: Dict[str, Any]) -> Tuple[int, Any, str]:
+    """Ascending key equivalent to LIST_SORT reversed (type order, created_at, id)"""
+    created_at = doc.get("created_at")
+    kind = created_at_type(created_at)
+    return CREATED_AT_TYPES.index(kind), created_at if kind != "null" else 0, doc.get("id") or ""
+
+def encode_page_cursor(doc: Dict[str, Any]) -> str:
+    """Opaque cursor pointing just after doc in LIST_SORT order"""
+    created_at = doc.get("created_at")
+    kind = created_at_type(created_at)
+    value = created_at.isoformat() if kind == "date" else created_at
+    raw = json.dumps({"c": value, "t": kind, "id": doc.get("id")}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_page_cursor(cursor: str) -> Tuple[Any, str]:
+    """Decode a cursor into (created_at, id), raising ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        kind, value = data["t"], data["c"]
+        if kind not in CREATED_AT_TYPES:
+            raise ValueError(kind)
+        if kind == "date":
+            value = datetime.fromisoformat(value)
+        return value, str(data["id"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+Page = Tuple[List[Dict[str, Any]], Optional[str]]
+
+class Storage(ABC):
+    """What server.py needs from a backend.
+
+    Listings are newest first (created_at, then id, descending, with created_at
+    ordered by type as MongoDB does) and return (documents, next page cursor).
+    Public review reads only see approved reviews. Documents are returned with
+    the API projection, so without _id.
+    """
+    cache: QueryCache
+
+    def connect(self):
+        """Open connections; called once from the app's startup event"""
+
+    async def close(self):
+        await self.cache.stop()
+
+    def start_cache_invalidation(self):
+        """Start listening for writes made by other processes, if the backend supports it"""
+
+    @abstractmethod
+    async def ensure_indexes(self) -> Dict[str, List[str]]:
+        """Report of {"created", "existing", "failed"} index names"""
+
+    @abstractmethod
+    async def seed_initial_data(self):
+        ...
+
+    @abstractmethod
+    async def backfill_review_locations(self) -> int:
+        ...
+
+    # Services
+    @abstractmethod
+    async def get_all_services(self) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def get_service_by_id(self, service_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def create_service(self, service: Service) -> str:
+        ...
+
+    # Reviews
+    @abstractmethod
+    async def get_reviews_page(self, limit: int, cursor: Optional[str] = None) -> Page:
+        ...
+
+    @abstractmethod
+    async def get_review_markers(self, bbox=None, near=None, max_distance: Optional[float] = None,
+                                 limit: int = 500) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def get_review_points(self) -> Optional[List[Dict[str, Any]]]:
+        ...
+
+    @abstractmethod
+    async def get_review_search_docs(self) -> Optional[List[Dict[str, Any]]]:
+        ...
+
+    @abstractmethod
+    async def get_review_stats(self) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def get_review_image_urls(self) -> List[str]:
+        ...
+
+    @abstractmethod
+    async def create_review(self, review: Review) -> str:
+        ...
+
+    @abstractmethod
+    async def ingest_reviews(self, reviews: List[Dict[str, Any]], source: str, prune: bool = True,
+                             dry_run: bool = False) -> Dict[str, int]:
+        """Idempotent bulk import; returns inserted/updated/deleted/unchanged/errors counts"""
+
+    # Quote requests, contacts and gallery
+    @abstractmethod
+    async def create_quote_request(self, quote: QuoteRequest) -> str:
+        ...
+
+    @abstractmethod
+    async def get_quote_requests_page(self, limit: int, cursor: Optional[str] = None) -> Page:
+        ...
+
+    @abstractmethod
+    async def create_contact(self, contact: Contact) -> str:
+        ...
+
+    @abstractmethod
+    async def get_contacts_page(self, limit: int, cursor: Optional[str] = None) -> Page:
+        ...
+
+    @abstractmethod
+    async def get_gallery_images_page(self, limit: int, cursor: Optional[str] = None) -> Page:
+        ...
+
+    @abstractmethod
+    async def create_gallery_image(self, image: GalleryImage) -> str:
+        ...
+
+def create_storage(backend: Optional[str] = None) -> Storage:
+    """Instantiate the backend named by STORAGE_BACKEND, importing only that backend's module"""
+    name = (backend or os.environ.get("STORAGE_BACKEND", "mongo")).lower()
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{name}', expected one of {', '.join(STORAGE_BACKENDS)}")
+    module_name, class_name = STORAGE_BACKENDS[name].split(":")
+    logger.info(f"Using {name} storage backend")
+    return getattr(importlib.import_module(module_name), class_name)()
@@ -0,0 +1,186 @@
+"""
+Per-upstream-host protection for outbound fetches: a concurrency cap and a
+circuit breaker, so a slow or failing origin cannot pile up coroutines and
+sockets across the whole API.
+
+Hosts come from request URLs, so the per-host state is kept in a bounded LRU:
+once it is full, the least recently used idle host is forgotten, preferring
+ones whose circuit is closed so a tripped breaker is not reset early.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """Raised instead of contacting a host whose circuit is open"""
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"Upstream {host} is unavailable, retry in {retry_after:.0f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Classic closed -> open -> half-open breaker driven by consecutive failures"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probe_in_flight = False
+        self._probe_started_at = 0.0
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self.retry_after() <= 0:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and self._probe_in_flight:
+            # A probe that never reported back must not hold the circuit half-open forever
+            if time.monotonic() - self._probe_started_at >= self.reset_timeout:
+                self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            # Let a single probe through to test the host
+            self._probe_in_flight = True
+            self._probe_started_at = time.monotonic()
+            return True
+        return False
+
+    def abandon(self):
+        """Re-arm the probe when an allowed request gave up before reaching the host"""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        self.state = self.CLOSED
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+class UpstreamHost:
+    def __init__(self, host: str, concurrency: int, failure_threshold: int, reset_timeout: float):
+        self.host = host
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.active = 0
+        self.waiting = 0
+        self.stats = {
+            'requests': 0,
+            'failures': 0,
+            'timeouts': 0,
+            'short_circuited': 0,
+        }
+
+    def check(self):
+        """Fail fast if the breaker is open"""
+        if not self.breaker.allow():
+            self.stats['short_circuited'] += 1
+            raise CircuitOpenError(self.host, self.breaker.retry_after())
+
+    def abandon(self):
+        self.breaker.abandon()
+
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.stats['requests'] += 1
+
+    def release(self):
+        self.active -= 1
+        self.semaphore.release()
+
+    def record_success(self):
+        self.breaker.record_success()
+
+    def record_failure(self, timeout: bool = False):
+        self.stats['failures'] += 1
+        if timeout:
+            self.stats['timeouts'] += 1
+        previous = self.breaker.state
+        self.breaker.record_failure()
+        if previous != CircuitBreaker.OPEN and self.breaker.state == CircuitBreaker.OPEN:
+            logger.warning(f"Circuit opened for upstream {self.host} after {self.breaker.consecutive_failures} failures")
+
+    @property
+    def idle(self) -> bool:
+        return self.active == 0 and self.waiting == 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'state': self.breaker.state,
+            'trips': self.breaker.trips,
+            'consecutive_failures': self.breaker.consecutive_failures,
+            'retry_after': round(self.breaker.retry_after(), 1) if self.breaker.state == CircuitBreaker.OPEN else 0,
+            'active': self.active,
+            'waiting': self.waiting,
+            'concurrency': self.concurrency,
+        }
+
+class UpstreamGuard:
+    def __init__(self):
+        self.concurrency = int(os.environ.get('UPSTREAM_PER_HOST_CONCURRENCY', 16))
+        self.failure_threshold = int(os.environ.get('UPSTREAM_BREAKER_FAILURES', 5))
+        self.reset_timeout = float(os.environ.get('UPSTREAM_BREAKER_RESET', 30.0))
+        self.max_hosts = int(os.environ.get('UPSTREAM_MAX_HOSTS', 256))
+        self._hosts: 'OrderedDict[str, UpstreamHost]' = OrderedDict()
+
+    def host(self, host: str) -> UpstreamHost:
+        upstream = self._hosts.get(host)
+        if upstream is not None:
+            self._hosts.move_to_end(host)
+            return upstream
+        upstream = UpstreamHost(host, self.concurrency, self.failure_threshold, self.reset_timeout)
+        self._hosts[host] = upstream
+        while len(self._hosts) > self.max_hosts:
+            victim = self._eviction_candidate()
+            if victim is None:
+                # Every host is busy; in-flight requests bound how far over we go
+                break
+            del self._hosts[victim]
+        return upstream
+
+    def _eviction_candidate(self) -> Optional[str]:
+        """Least recently used idle host, closed circuits first"""
+        fallback = None
+        for name, upstream in self._hosts.items():
+            if not upstream.idle:
+                continue
+            if upstream.breaker.state == CircuitBreaker.CLOSED:
+                return name
+            if fallback is None:
+                fallback = name
+        return fallback
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {host: upstream.get_stats() for host, upstream in self._hosts.items()}
+
+# Global upstream guard instance
+upstream_guard = UpstreamGuard()
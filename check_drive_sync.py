@@ -0,0 +1,242 @@
+"""
+Check the Drive gallery sync against the real gallery dataset without touching
+Google Drive.
+
+A fake Drive client is seeded with the files behind real_gallery_data.json and
+records every edit made to it as a changes feed. The check then makes sure that:
+- a full crawl reproduces the dataset unchanged;
+- an incremental sync over the recorded edits patches the dataset correctly;
+- a full crawl after those edits agrees with the incremental result.
+
+Usage: python check_drive_sync.py [gallery_path]
+"""
+import copy
+import json
+import os
+import re
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+from google_drive_api import RealGoogleDriveAPI
+
+DEFAULT_GALLERY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend', 'public', 'real_gallery_data.json')
+
+# Parent of the curated photos, a folder the crawl does not know about
+CURATED_FOLDER = 'curated-folder'
+UNRELATED_FOLDER = 'unrelated-folder'
+
+class _Request:
+    def __init__(self, result: Dict[str, Any]):
+        self._result = result
+
+    def execute(self, num_retries: int = 0) -> Dict[str, Any]:
+        return copy.deepcopy(self._result)
+
+class FakeDrive:
+    """Just enough of the Drive v3 client for list_folder_files and list_changes,
+    with small pages so pagination is exercised"""
+
+    def __init__(self, files: List[Dict[str, Any]], page_size: int = 50):
+        self.page_size = page_size
+        self.files_by_id = {f['id']: f for f in files}
+        self.log: List[Dict[str, Any]] = []
+
+    # Edits, each recorded in the changes feed
+    def put(self, file: Dict[str, Any]):
+        self.files_by_id[file['id']] = file
+        self.log.append({'fileId': file['id'], 'removed': False, 'file': copy.deepcopy(file)})
+
+    def delete(self, file_id: str):
+        del self.files_by_id[file_id]
+        self.log.append({'fileId': file_id, 'removed': True})
+
+    # Client interface
+    def files(self):
+        return self
+
+    def changes(self):
+        return _Changes(self)
+
+    def list(self, q: str, pageToken=None, **kwargs):
+        folder_id = re.search(r"parents in '([^']+)'", q).group(1)
+        prefixes = re.findall(r"mimeType contains '([^']+)'", q)
+        matches = [
+            {k: v for k, v in f.items() if k != 'parents'}
+            for f in self.files_by_id.values()
+            if folder_id in f['parents'] and not f.get('trashed') and f['mimeType'].startswith(tuple(prefixes))
+        ]
+        start = int(pageToken or 0)
+        result = {'files': matches[start:start + self.page_size]}
+        if start + self.page_size < len(matches):
+            result['nextPageToken'] = str(start + self.page_size)
+        return _Request(result)
+
+class _Changes:
+    def __init__(self, drive: FakeDrive):
+        self.drive = drive
+
+    def getStartPageToken(self):
+        return _Request({'startPageToken': str(len(self.drive.log))})
+
+    def list(self, pageToken: str, **kwargs):
+        start = int(pageToken)
+        end = min(start + self.drive.page_size, len(self.drive.log))
+        result = {'changes': self.drive.log[start:end]}
+        if end < len(self.drive.log):
+            result['nextPageToken'] = str(end)
+        else:
+            result['newStartPageToken'] = str(end)
+        return _Request(result)
+
+def drive_files(api: RealGoogleDriveAPI, gallery_data: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The Drive files behind a dataset; photo id prefixes name their folder"""
+    folder_ids = {re.sub(r'\W+', '_', name.lower()): folder_id for name, folder_id in api.service_folders.items()}
+    files = []
+    for album in gallery_data.values():
+        for photo in album['photos']:
+            prefix = photo['id'].rpartition('_')[0]
+            files.append({
+                'id': photo['drive_id'],
+                'name': photo['name'],
+                'mimeType': photo['mime_type'],
+                'size': photo['size'],
+                'createdTime': photo['created'],
+                'webViewLink': f"https://drive.google.com/file/d/{photo['drive_id']}/view",
+                'parents': [folder_ids.get(prefix, CURATED_FOLDER)],
+            })
+    return files
+
+def find_photo(gallery_data: Dict[str, Dict[str, Any]], album_name: str, index: int) -> Dict[str, Any]:
+    return gallery_data[album_name]['photos'][index]
+
+def record_edits(api: RealGoogleDriveAPI, drive: FakeDrive, gallery_data: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    """Make a mix of edits in the fake Drive; returns the summary they should produce"""
+    def file_of(album_name: str, index: int) -> Dict[str, Any]:
+        return copy.deepcopy(drive.files_by_id[find_photo(gallery_data, album_name, index)['drive_id']])
+
+    folders = api.service_folders
+    drive.put({'id': 'new-photo', 'name': 'IMG_9001.JPG', 'mimeType': 'image/jpeg', 'size': '2048',
+               'createdTime': '2026-01-02T10:00:00.000Z', 'parents': [folders['General']]})
+    drive.put({'id': 'new-video', 'name': 'IMG_9002.MOV', 'mimeType': 'video/quicktime', 'size': '4096',
+               'createdTime': '2026-01-02T11:00:00.000Z', 'parents': [folders['Planting']]})
+    drive.put({'id': 'quote.pdf', 'name': 'quote.pdf', 'mimeType': 'application/pdf', 'size': '100',
+               'createdTime': '2026-01-02T12:00:00.000Z', 'parents': [folders['Patio']]})
+    drive.put({'id': 'elsewhere', 'name': 'IMG_9003.JPG', 'mimeType': 'image/jpeg', 'size': '100',
+               'createdTime': '2026-01-02T13:00:00.000Z', 'parents': [UNRELATED_FOLDER]})
+
+    renamed = file_of('Pruning', 3)
+    drive.put({**renamed, 'name': 'renamed.jpg'})
+    drive.put(file_of('Trellis', 0))
+    drive.put({**file_of('Garden Clearance', 5), 'trashed': True})
+    drive.delete(file_of('Turfing', 10)['id'])
+    drive.put({**file_of('Patio', 2), 'parents': [folders['Trellis']]})
+    # Curated photos: one that Lawn Care also shows, and one only the curated album has
+    drive.put({**file_of('Garden Maintenance', 1), 'name': 'curated-renamed.jpg'})
+    shown_elsewhere = {p['drive_id'] for name, album in gallery_data.items() if name != 'Garden Maintenance' for p in album['photos']}
+    curated_only = next(i for i, p in enumerate(gallery_data['Garden Maintenance']['photos']) if p['drive_id'] not in shown_elsewhere)
+    drive.delete(file_of('Garden Maintenance', curated_only)['id'])
+    return {'added': 2, 'updated': 3, 'unchanged': 2, 'removed': 3, 'ignored': 2}
+
+def problems_in(gallery_data: Dict[str, Dict[str, Any]], original: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Shape and invariants every synced dataset must keep"""
+    problems = []
+    photo_fields = {field for album in original.values() for photo in album['photos'] for field in photo}
+    if list(gallery_data) != list(original):
+        problems.append(f"albums changed: {list(gallery_data)}")
+    photo_ids = [p['id'] for album in gallery_data.values() for p in album['photos']]
+    if len(photo_ids) != len(set(photo_ids)):
+        problems.append("duplicate photo id")
+    for name, album in gallery_data.items():
+        before = original.get(name, {})
+        for field in ('cover_photo', 'description', 'service_name'):
+            if field in before and album.get(field) != before[field]:
+                problems.append(f"{name}: {field} changed")
+        drive_ids = [p['drive_id'] for p in album['photos']]
+        if len(drive_ids) != len(set(drive_ids)):
+            problems.append(f"{name}: duplicate drive_id")
+        if album['photo_count'] != len(album['photos']):
+            problems.append(f"{name}: photo_count is stale")
+        for photo in album['photos']:
+            if set(photo) != photo_fields:
+                problems.append(f"{name}/{photo['id']}: fields {sorted(set(photo) ^ photo_fields)} differ")
+            if photo['service'] != name:
+                problems.append(f"{name}/{photo['id']}: service is {photo['service']}")
+    return problems
+
+def report(label: str, problems: List[str]) -> bool:
+    print(f"{label:<48} {'ok' if not problems else 'FAILED'}")
+    for problem in problems[:20]:
+        print(f"    {problem}")
+    return not problems
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_GALLERY_PATH
+    with open(path, 'r') as f:
+        original = json.load(f)
+
+    drive = FakeDrive([])
+    api = RealGoogleDriveAPI(service=drive)
+    drive.files_by_id = {f['id']: f for f in drive_files(api, original)}
+    ok = True
+
+    # A full crawl of an unchanged Drive leaves the dataset as it is
+    crawled = api.build_gallery_data(copy.deepcopy(original))
+    ok &= report("full crawl over the dataset is a no-op", [] if crawled == original else problems_in(crawled, original) or ["dataset differs"])
+
+    # A fresh crawl (no dataset) emits the same albums, ids and photo fields
+    fresh = api.build_gallery_data()
+    expected = {name: [p['id'] for p in album['photos']] for name, album in original.items() if api.gallery_albums.get(name)}
+    problems = [f"{name}: photos differ" for name in expected if [p['id'] for p in fresh.get(name, {}).get('photos', [])] != expected[name]]
+    if list(fresh) != list(expected):
+        problems.append(f"albums are {list(fresh)}")
+    problems += [p for p in problems_in(fresh, {n: a for n, a in original.items() if n in fresh}) if 'description' not in p and 'cover_photo' not in p]
+    ok &= report("fresh crawl matches the dataset shape", problems)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        gallery_path = os.path.join(tmp, 'real_gallery_data.json')
+        token_path = gallery_path + '.sync_token.json'
+        with open(gallery_path, 'w') as f:
+            json.dump(original, f)
+        with open(token_path, 'w') as f:
+            json.dump({'page_token': drive.changes().getStartPageToken().execute()['startPageToken']}, f)
+
+        expected_summary = record_edits(api, drive, original)
+        summary = api.sync_gallery(gallery_path, token_path)
+        with open(gallery_path, 'r') as f:
+            synced = json.load(f)
+        counts = {key: summary[key] for key in expected_summary}
+        problems = problems_in(synced, original)
+        if counts != expected_summary:
+            problems.append(f"summary {counts}, expected {expected_summary}")
+        pruning = find_photo(original, 'Pruning', 3)
+        if find_photo(synced, 'Pruning', 3) != {**pruning, 'name': 'renamed.jpg'}:
+            problems.append("renamed photo was not updated in place")
+        moved = find_photo(original, 'Patio', 2)
+        if synced['Trellis']['photos'][-1]['drive_id'] != moved['drive_id'] or synced['Trellis']['photos'][-1]['id'] != moved['id']:
+            problems.append("moved photo did not keep its id in its new album")
+        if synced['Turfing']['photos'][-1]['id'] != f"general_{len(original['Turfing']['photos']) + 1}":
+            problems.append(f"new photo got id {synced['Turfing']['photos'][-1]['id']}")
+        curated = find_photo(original, 'Garden Maintenance', 1)
+        if find_photo(synced, 'Garden Maintenance', 1) != curated:
+            problems.append("curated photo was changed")
+        if not any(p['drive_id'] == curated['drive_id'] and p['name'] == 'curated-renamed.jpg' for p in synced['Lawn Care']['photos']):
+            problems.append("crawled copy of a curated photo was not updated")
+        if len(synced['Garden Maintenance']['photos']) != len(original['Garden Maintenance']['photos']) - 1:
+            problems.append("deleted curated photo was kept")
+        ok &= report(f"incremental sync of {len(drive.log)} recorded changes", problems)
+
+        # Nothing new: only the token moves
+        again = api.sync_gallery(gallery_path, token_path)
+        ok &= report("sync with no new changes writes nothing", [] if again['changes'] == 0 else [f"{again}"])
+
+        # The crawl and the changes feed agree on every crawled album
+        recrawled = api.build_gallery_data(copy.deepcopy(original))
+        problems = [f"{name}: crawl and changes feed differ" for name in synced
+                    if api.gallery_albums.get(name) and recrawled[name] != synced[name]]
+        ok &= report("full crawl after the edits matches the sync", problems)
+
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -36,6 +36,18 @@ apiClient.interceptors.response.use(
   }
 );
 
+// List endpoints return one page at a time; the next page's cursor comes back in X-Next-Cursor
+const getAllPages = async (path, pageSize = 200) => {
+  const items = [];
+  let cursor = null;
+  do {
+    const response = await apiClient.get(path, { params: { limit: pageSize, cursor: cursor || undefined } });
+    items.push(...response.data);
+    cursor = response.headers['x-next-cursor'];
+  } while (cursor);
+  return items;
+};
+
 // API Service Functions
 export const apiService = {
   // Services
@@ -62,14 +74,56 @@ export const apiService = {
   // Reviews
   async getReviews() {
     try {
-      const response = await apiClient.get('/reviews');
-      return response.data;
+      return await getAllPages('/reviews');
     } catch (error) {
       console.error('Error fetching reviews:', error);
       throw error;
     }
   },
 
+  // bounds is a Leaflet LatLngBounds; returns lean markers for the visible area only
+  async getReviewMarkers(bounds) {
+    try {
+      const response = await apiClient.get('/reviews/map', { params: { bbox: bounds.toBBoxString() } });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching review markers:', error);
+      throw error;
+    }
+  },
+
+  // Clusters for the visible area at the map's zoom: { zoom, clusters: [{ lat, lng, count, average_rating, ... }] }
+  async getReviewClusters(bounds, zoom) {
+    try {
+      const response = await apiClient.get('/reviews/clusters', { params: { bbox: bounds.toBBoxString(), zoom } });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching review clusters:', error);
+      throw error;
+    }
+  },
+
+  // Ranked reviews matching query; filters: { min_rating, max_rating, postcode, service, limit, offset }
+  async searchReviews(query, filters = {}) {
+    try {
+      const response = await apiClient.get('/reviews/search', { params: { q: query, ...filters } });
+      return response.data;
+    } catch (error) {
+      console.error('Error searching reviews:', error);
+      throw error;
+    }
+  },
+
+  async getReviewStats() {
+    try {
+      const response = await apiClient.get('/reviews/stats');
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching review stats:', error);
+      throw error;
+    }
+  },
+
   async createReview(reviewData) {
     try {
       const response = await apiClient.post('/reviews', reviewData);
@@ -93,8 +147,7 @@ export const apiService = {
 
   async getQuoteRequests() {
     try {
-      const response = await apiClient.get('/quotes');
-      return response.data;
+      return await getAllPages('/quotes');
     } catch (error) {
       console.error('Error fetching quote requests:', error);
       throw error;
@@ -114,8 +167,7 @@ export const apiService = {
 
   async getContacts() {
     try {
-      const response = await apiClient.get('/contacts');
-      return response.data;
+      return await getAllPages('/contacts');
     } catch (error) {
       console.error('Error fetching contacts:', error);
       throw error;
@@ -125,8 +177,7 @@ export const apiService = {
   // Gallery
   async getGalleryImages() {
     try {
-      const response = await apiClient.get('/gallery');
-      return response.data;
+      return await getAllPages('/gallery');
     } catch (error) {
       console.error('Error fetching gallery images:', error);
       throw error;
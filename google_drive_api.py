@@ -3,12 +3,37 @@
 
 import json
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.discovery import build
 from google.oauth2 import service_account
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+
+# Only the file fields we turn into gallery photos
+FILE_FIELDS = "id, name, mimeType, size, createdTime, webViewLink"
+
+# Incremental sync: the gallery dataset and the Drive changes token it is current as of
+GALLERY_DATA_PATH = os.environ.get('GALLERY_DATA_PATH', '/app/real_gallery_data.json')
+GALLERY_SYNC_TOKEN_PATH = os.environ.get('GALLERY_SYNC_TOKEN_PATH', GALLERY_DATA_PATH + '.sync_token.json')
+
+# Files the legacy album crawl (get_all_service_albums) lists as photos
+PHOTO_QUERY = "(mimeType contains 'image/' or name contains '.jpg' or name contains '.jpeg' or name contains '.png' or name contains '.heic')"
+
+# The gallery dataset includes short videos as well as photos; the gallery crawl and
+# the changes feed both go through is_gallery_file so they agree on what belongs
+GALLERY_MIME_PREFIXES = ('image/', 'video/')
+
+def is_gallery_file(file: Dict[str, Any]) -> bool:
+    return file.get('mimeType', '').startswith(GALLERY_MIME_PREFIXES) and not file.get('trashed')
 
 class RealGoogleDriveAPI:
-    def __init__(self):
+    def __init__(self, service=None, max_workers: Optional[int] = None):
+        """
+        service: an already-built Drive client (or a local fake with the same
+        files().list(...).execute() interface); skips authentication when given.
+        max_workers: how many folders to crawl at once.
+        """
         # Your service account credentials
         self.credentials_json = {
             "type": "service_account",
@@ -37,10 +62,34 @@ class RealGoogleDriveAPI:
             "General": "1oRHb8w7XCDnZRq7hHSIfXPHe8dedi4ab"
         }
         
-        self.service = None
+        # Gallery dataset albums and the Drive folders they are built from, in dataset
+        # order. Album names are the services shown on the site, not the folder names.
+        # Garden Maintenance is curated by hand and not crawled.
+        self.gallery_albums = {
+            "Garden Maintenance": [],
+            "Garden Clearance": ["Tree Services"],
+            "Hedge Trimming": ["Maintenance"],
+            "Turfing": ["General"],
+            "Lawn Care": ["Garden Clearance", "Lawn Care"],
+            "Planting": ["Planting"],
+            "Patio": ["Patio"],
+            "Pruning": ["Hedge Trimming"],
+            "Trellis": ["Trellis"]
+        }
+        
+        self.service = service
+        self.credentials = None
+        self.max_workers = max_workers or int(os.environ.get('DRIVE_CRAWL_WORKERS', 8))
+        # Retries (with exponential backoff) for rate-limited or failed Drive requests
+        self.num_retries = int(os.environ.get('DRIVE_REQUEST_RETRIES', 5))
+        # googleapiclient clients are not thread-safe, so each crawl thread builds its own
+        self._local = threading.local()
         
     def authenticate(self):
         """Authenticate with Google Drive API"""
+        if self.service is not None and self.credentials is None:
+            # Injected client (e.g. a fake Drive service), nothing to authenticate
+            return True
         try:
             # Create credentials from the JSON
             credentials = service_account.Credentials.from_service_account_info(
@@ -49,7 +98,8 @@ class RealGoogleDriveAPI:
             )
             
             # Build the Drive API service
-            self.service = build('drive', 'v3', credentials=credentials)
+            self.credentials = credentials
+            self.service = build('drive', 'v3', credentials=credentials, cache_discovery=False)
             print("✅ Successfully authenticated with Google Drive API")
             return True
             
@@ -57,25 +107,57 @@ class RealGoogleDriveAPI:
             print(f"❌ Authentication failed: {str(e)}")
             return False
     
+    def _thread_service(self):
+        """Drive client for the current thread"""
+        if self.credentials is None:
+            # Injected client, shared as-is
+            return self.service
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = build('drive', 'v3', credentials=self.credentials, cache_discovery=False)
+            self._local.service = service
+        return service
+    
+    def list_folder_files(self, folder_id: str, mime_prefixes: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """List every file in a folder, following nextPageToken until exhausted.
+        
+        mime_prefixes restricts the listing to those MIME types (the gallery sync);
+        by default the photo filter of the legacy album crawl applies.
+        """
+        service = self._thread_service()
+        if mime_prefixes:
+            file_filter = "(" + " or ".join(f"mimeType contains '{prefix}'" for prefix in mime_prefixes) + ")"
+        else:
+            file_filter = PHOTO_QUERY
+        query = f"parents in '{folder_id}' and trashed = false and {file_filter}"
+        
+        files = []
+        page_token = None
+        while True:
+            results = service.files().list(
+                q=query,
+                fields=f"nextPageToken, files({FILE_FIELDS})",
+                pageSize=1000,
+                pageToken=page_token
+            ).execute(num_retries=self.num_retries)
+            files.extend(results.get('files', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return files
+    
     def get_folder_files(self, folder_id: str, service_name: str) -> List[Dict[str, Any]]:
-        """Get all image files from a specific folder"""
+        """Get all image files from a specific folder.
+        
+        Raises if the folder can't be listed, so a crawl fails as a whole rather than
+        producing albums that are silently missing photos.
+        """
         if not self.service:
-            print("❌ Not authenticated. Call authenticate() first.")
-            return []
+            raise RuntimeError("Not authenticated. Call authenticate() first.")
         
         try:
             print(f"🔍 Fetching photos from {service_name} folder...")
             
-            # Query for image files in the folder
-            query = f"parents in '{folder_id}' and (mimeType contains 'image/' or name contains '.jpg' or name contains '.jpeg' or name contains '.png' or name contains '.heic')"
-            
-            results = self.service.files().list(
-                q=query,
-                fields="files(id, name, mimeType, size, createdTime, webViewLink)",
-                pageSize=1000  # Get up to 1000 files
-            ).execute()
-            
-            files = results.get('files', [])
+            files = self.list_folder_files(folder_id)
             
             # Convert to our photo format
             photos = []
@@ -100,14 +182,13 @@ class RealGoogleDriveAPI:
             
         except Exception as e:
             print(f"❌ Error fetching {service_name} photos: {str(e)}")
-            return []
+            raise
     
     def get_all_service_albums(self) -> Dict[str, Dict[str, Any]]:
         """Get all photos organized by service albums"""
         
         if not self.authenticate():
-            print("❌ Failed to authenticate with Google Drive")
-            return {}
+            raise RuntimeError("Failed to authenticate with Google Drive")
         
         print("🚀 FETCHING ALL REAL PHOTOS FROM GOOGLE DRIVE")
         print("="*60)
@@ -115,9 +196,12 @@ class RealGoogleDriveAPI:
         service_albums = {}
         total_photos = 0
         
-        for service_name, folder_id in self.service_folders.items():
-            photos = self.get_folder_files(folder_id, service_name)
-            
+        # Crawl folders concurrently; map() keeps results in service_folders order
+        folders = list(self.service_folders.items())
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(folders)))) as executor:
+            folder_photos = list(executor.map(lambda item: self.get_folder_files(item[1], item[0]), folders))
+        
+        for (service_name, folder_id), photos in zip(folders, folder_photos):
             if photos:
                 # Create service album
                 service_albums[service_name] = {
@@ -166,6 +250,241 @@ class RealGoogleDriveAPI:
         }
         return descriptions.get(service_name, f'Professional {service_name.lower()} services in London.')
 
+    # Gallery dataset (real_gallery_data.json) built by a full crawl or patched
+    # incrementally from the Drive changes feed
+    
+    def _folder_albums(self) -> Dict[str, tuple]:
+        """Drive folder id -> (album name, folder name)"""
+        return {
+            self.service_folders[folder]: (album, folder)
+            for album, folders in self.gallery_albums.items()
+            for folder in folders
+        }
+    
+    def _new_album(self, album_name: str) -> Dict[str, Any]:
+        return {
+            'service_name': album_name,
+            'photo_count': 0,
+            'description': self.get_service_description(album_name),
+            'cover_photo': None,
+            'photos': []
+        }
+    
+    def build_gallery_photo(self, file: Dict[str, Any], album_name: str, photo_id: str, description: str) -> Dict[str, Any]:
+        """Convert a Drive file into the real_gallery_data.json photo format"""
+        return {
+            'id': photo_id,
+            'name': file.get('name', ''),
+            'url': f"https://drive.google.com/uc?export=view&id={file['id']}",
+            'thumbnail_url': f"https://drive.google.com/thumbnail?id={file['id']}&sz=w400",
+            'service': album_name,
+            'description': description,
+            'size': file.get('size', '0'),
+            'mime_type': file.get('mimeType', ''),
+            'created': file.get('createdTime', ''),
+            'drive_id': file['id']
+        }
+    
+    def build_gallery_data(self, existing: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+        """Full crawl of every gallery folder into the dataset format.
+        
+        Given the current dataset, the crawl is reconciled against it the same way the
+        changes feed is, so photo ids, positions, covers and curated albums survive.
+        """
+        folder_albums = self._folder_albums()
+        folders = list(folder_albums)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(folders)))) as executor:
+            folder_files = list(executor.map(lambda folder_id: self.list_folder_files(folder_id, GALLERY_MIME_PREFIXES), folders))
+        
+        # Express the crawl as changes: every listed file, plus a move out of the crawled
+        # folders for each crawled-album photo that is no longer listed (curated albums
+        # may still show it)
+        changes = []
+        listed = set()
+        for folder_id, files in zip(folders, folder_files):
+            for file in filter(is_gallery_file, files):
+                listed.add(file['id'])
+                changes.append({'fileId': file['id'], 'file': {**file, 'parents': [folder_id]}})
+        gallery_data = {name: {**album, 'photos': list(album['photos'])} for name, album in (existing or {}).items()}
+        crawled_albums = {album for album, _ in folder_albums.values()}
+        for name, album in gallery_data.items():
+            if name not in crawled_albums:
+                continue
+            for photo in album['photos']:
+                if photo['drive_id'] not in listed:
+                    listed.add(photo['drive_id'])
+                    changes.append({'fileId': photo['drive_id'], 'file': {
+                        'name': photo['name'],
+                        'mimeType': photo['mime_type'],
+                        'size': photo['size'],
+                        'createdTime': photo['created'],
+                        'parents': []
+                    }})
+        
+        self.apply_changes(gallery_data, changes)
+        if existing is None:
+            gallery_data = {name: gallery_data[name] for name in self.gallery_albums if name in gallery_data}
+        return gallery_data
+    
+    def get_start_page_token(self) -> str:
+        """Token marking 'now' in the Drive changes feed"""
+        return self._thread_service().changes().getStartPageToken().execute()['startPageToken']
+    
+    def list_changes(self, page_token: str):
+        """Every change since page_token, plus the token to resume from next time"""
+        service = self._thread_service()
+        changes = []
+        while True:
+            results = service.changes().list(
+                pageToken=page_token,
+                spaces='drive',
+                includeRemoved=True,
+                pageSize=1000,
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}, parents, trashed))"
+            ).execute()
+            changes.extend(results.get('changes', []))
+            if 'newStartPageToken' in results:
+                return changes, results['newStartPageToken']
+            page_token = results['nextPageToken']
+    
+    def apply_changes(self, gallery_data: Dict[str, Dict[str, Any]], changes: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Patch the gallery dataset in place from a list of Drive changes.
+        
+        Photos are matched on drive_id. A file's folder decides which crawled album it
+        belongs to; curated albums may repeat crawled files and are left as they are
+        unless the file is deleted. Albums are only created when a photo lands in one,
+        and existing albums keep their covers and descriptions.
+        """
+        folder_albums = self._folder_albums()
+        located: Dict[str, List[tuple]] = {}
+        next_number = {}
+        for album_name, album in gallery_data.items():
+            for photo in album['photos']:
+                located.setdefault(photo['drive_id'], []).append((album_name, photo))
+                prefix, _, number = photo['id'].rpartition('_')
+                if number.isdigit():
+                    next_number[prefix] = max(next_number.get(prefix, 1), int(number) + 1)
+        
+        def new_photo_id(folder_name: str) -> str:
+            prefix = re.sub(r'\W+', '_', folder_name.lower())
+            number = next_number.get(prefix, 1)
+            next_number[prefix] = number + 1
+            return f"{prefix}_{number}"
+        
+        def photo_description(album_name: str) -> str:
+            photos = gallery_data[album_name]['photos']
+            return photos[0]['description'] if photos else f"Professional {album_name.lower()} work"
+        
+        def position(album_name: str, photo: Dict[str, Any]) -> int:
+            return next(i for i, p in enumerate(gallery_data[album_name]['photos']) if p is photo)
+        
+        summary = {'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0, 'ignored': 0}
+        for change in changes:
+            file_id = change.get('fileId')
+            file = {**(change.get('file') or {}), 'id': file_id}
+            alive = not change.get('removed') and is_gallery_file(file)
+            target = None
+            if alive:
+                target = next((folder_albums[p] for p in file.get('parents', []) if p in folder_albums), None)
+            
+            previous = located.pop(file_id, [])
+            if not previous and target is None:
+                summary['ignored'] += 1
+                continue
+            
+            entries = []
+            moved = None
+            for album_name, old in previous:
+                crawled = bool(self.gallery_albums.get(album_name))
+                if not alive or (crawled and target is None):
+                    del gallery_data[album_name]['photos'][position(album_name, old)]
+                    summary['removed'] += 1
+                elif not crawled:
+                    summary['unchanged'] += 1
+                    entries.append((album_name, old))
+                elif album_name != target[0]:
+                    # Moved between albums; it keeps its id so links and page cursors stay valid
+                    del gallery_data[album_name]['photos'][position(album_name, old)]
+                    moved = old
+                else:
+                    photo = self.build_gallery_photo(file, album_name, old['id'], old['description'])
+                    if photo == old:
+                        summary['unchanged'] += 1
+                    else:
+                        # Keep its position in the album
+                        gallery_data[album_name]['photos'][position(album_name, old)] = photo
+                        summary['updated'] += 1
+                    entries.append((album_name, photo))
+            
+            if target is not None and target[0] not in (album_name for album_name, _ in entries):
+                album_name, folder_name = target
+                if album_name not in gallery_data:
+                    gallery_data[album_name] = self._new_album(album_name)
+                if moved:
+                    photo_id = moved['id']
+                    summary['updated'] += 1
+                else:
+                    photo_id = new_photo_id(folder_name)
+                    summary['added'] += 1
+                photo = self.build_gallery_photo(file, album_name, photo_id, photo_description(album_name))
+                gallery_data[album_name]['photos'].append(photo)
+                entries.append((album_name, photo))
+            
+            if entries:
+                located[file_id] = entries
+        
+        for album in gallery_data.values():
+            album['photo_count'] = len(album['photos'])
+            if not album.get('cover_photo'):
+                cover = next((p for p in album['photos'] if p['mime_type'].startswith('image/')), None)
+                album['cover_photo'] = cover['url'] if cover else None
+        return summary
+    
+    def sync_gallery(self, gallery_path: str = GALLERY_DATA_PATH, token_path: str = GALLERY_SYNC_TOKEN_PATH) -> Dict[str, Any]:
+        """Bring the gallery dataset up to date using the Drive changes feed.
+        
+        With no saved token (or no dataset) this takes a start token first and then
+        does a full crawl, so nothing that changes during the crawl is missed. After
+        that each run only fetches what was added, removed or modified since.
+        """
+        if not self.authenticate():
+            raise RuntimeError("Failed to authenticate with Google Drive")
+        
+        token = None
+        if os.path.exists(token_path) and os.path.exists(gallery_path):
+            with open(token_path, 'r') as f:
+                token = json.load(f).get('page_token')
+        
+        if token is None:
+            existing = None
+            if os.path.exists(gallery_path):
+                with open(gallery_path, 'r') as f:
+                    existing = json.load(f)
+            new_token = self.get_start_page_token()
+            gallery_data = self.build_gallery_data(existing)
+            summary = {'mode': 'full', 'photos': sum(a['photo_count'] for a in gallery_data.values())}
+        else:
+            with open(gallery_path, 'r') as f:
+                gallery_data = json.load(f)
+            changes, new_token = self.list_changes(token)
+            summary = {'mode': 'incremental', 'changes': len(changes), **self.apply_changes(gallery_data, changes)}
+            if not changes:
+                # Nothing to patch; only move the token forward
+                _write_json_atomic(token_path, {'page_token': new_token})
+                return summary
+        
+        # Dataset first, then token: a crash in between just replays the same changes
+        _write_json_atomic(gallery_path, gallery_data)
+        _write_json_atomic(token_path, {'page_token': new_token})
+        return summary
+
+def _write_json_atomic(path: str, data: Any):
+    """Write JSON via a temp file and rename, so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
 def test_google_drive_integration():
     """Test the Google Drive integration"""
     
@@ -206,4 +525,11 @@ def test_google_drive_integration():
         print("3. Verify the service account has 'Viewer' permission")
 
 if __name__ == "__main__":
-    test_google_drive_integration()
\ No newline at end of file
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == 'sync':
+        # python google_drive_api.py sync [gallery_path]
+        path = sys.argv[2] if len(sys.argv) > 2 else GALLERY_DATA_PATH
+        result = RealGoogleDriveAPI().sync_gallery(path, path + '.sync_token.json')
+        print(f"✅ Gallery sync complete: {result}")
+    else:
+        test_google_drive_integration()
\ No newline at end of file